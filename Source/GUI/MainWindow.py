@@ -14,6 +14,8 @@ class MainWindow(QMainWindow):
         super(MainWindow, self).__init__()
 
         self._format = kwargs.get("format", None)
+        # options handed to the renderer, such as hot_reload
+        self._options = kwargs.get("options", {})
 
         self.initialize()
 
@@ -71,7 +73,7 @@ class MainWindow(QMainWindow):
         self.statusBar().addPermanentWidget(self.statistics)
 
         # create scene
-        self._renderWidget = RenderWidget(self, font=fontSize10)
+        self._renderWidget = RenderWidget(self, font=fontSize10, **self._options)
 
         # set the renderer as main widget
         self.setCentralWidget(self._renderWidget)
@@ -110,6 +112,7 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, closeEvent):
         """Intercept close event and perform clean-up"""
+        self._renderWidget.shutdown()
 
         # then propagae event
         super(MainWindow, self).closeEvent(closeEvent)
@@ -122,6 +122,17 @@ class RenderWidget(QWidget):
         self._addObject.setFont(self._font)
         self._addObject.clicked.connect(self._renderer.add_object)
         self._addLayout.addWidget(self._addObject)
+        self._addDirectory = QPushButton(self)
+        self._addDirectory.setText("Add Directory")
+        self._addDirectory.setFont(self._font)
+        self._addDirectory.clicked.connect(self._renderer.add_directory)
+        self._addLayout.addWidget(self._addDirectory)
+        self._loadingBar = QProgressBar(self)
+        self._loadingBar.setFont(self._font)
+        self._loadingBar.setMaximumWidth(120)
+        self._loadingBar.setVisible(False)
+        self._renderer.objectLoader().progress.connect(self.loadingProgress)
+        self._addLayout.addWidget(self._loadingBar)
         self._bottomLayout.addLayout(self._addLayout)
 
         menu = QMenu()
@@ -161,6 +172,10 @@ class RenderWidget(QWidget):
         """Clear viewer"""
         self._renderer.clear()
 
+    def shutdown(self):
+        """Stop background work before closing"""
+        self._renderer.objectLoader().shutdown()
+
     def updateViewer(self):
         """Refresh viewer"""
         self._renderer.update()
@@ -208,6 +223,17 @@ class RenderWidget(QWidget):
         """Turn on or off animation"""
         self._renderer.enableAnimation(state)
 
+    def loadingProgress(self, done, total):
+        """Show how many of the objects being loaded are ready"""
+        if total == 1:
+            # a single file, just show that we are busy
+            self._loadingBar.setRange(0, 0)
+        else:
+            self._loadingBar.setRange(0, total)
+            self._loadingBar.setValue(done)
+        self._loadingBar.setFormat("{}/{}".format(done, total))
+        self._loadingBar.setVisible(total > 0)
+
     def renderTimeEstimates(self):
         """Ask viewer for current render time estimates"""
         return self._renderer.renderTimeEstimates()
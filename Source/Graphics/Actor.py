@@ -8,7 +8,8 @@ from PyQt5.QtWidgets import QOpenGLWidget
 
 from OpenGL import GL
 from Source.Graphics.Shaders import Shaders
-from Source.Graphics.Material import Material
+from Source.Graphics.Materials import Materials
+from mesh import quantize_positions, pack_normals, interleave
 
 # Abstract base class for different actor implementations.
 
@@ -35,6 +36,25 @@ class Actor(QObject):
         Modes = [Points, Lines, LineLoop, LineStrip,
                  Triangles, TriangleStrip, TriangleFan]
 
+    # The layout of vertex attributes in the vertex buffer. Compact formats
+    # store positions relative to the bounds of the mesh, normals packed in
+    # 10 bits per component and texcoords as half floats.
+
+    class VertexFormat:
+        Float = 0  # float32 positions, normals and texcoords.
+        Half = 1  # float16 positions.
+        Normalized = 2  # normalized int16 positions.
+        Formats = [Float, Half, Normalized]
+
+    # Where the attributes of a vertex are in the vertex buffer. Planar
+    # buffers hold all positions, then all normals, colors and texcoords,
+    # interleaved ones hold every attribute of a vertex next to each other.
+
+    class VertexLayout:
+        Planar = 0
+        Interleaved = 1
+        Layouts = [Planar, Interleaved]
+
     # initialization
 
     def __init__(self, scene, **kwargs):
@@ -45,9 +65,13 @@ class Actor(QObject):
         self._transform = kwargs.get("transform", QMatrix4x4())
         self._render_mode = kwargs.get("mode", Actor.RenderMode.Triangles)
         self._render_type = kwargs.get("type", Actor.RenderType.Solid)
-        self._material = kwargs.get("material", Material())
-        self._wireframe = kwargs.get("wireframe", Material(
-            diffuse=QVector3D(0.25, 0.25, 0.25)))
+        self._vertex_format = kwargs.get("vertex_format", Actor.VertexFormat.Float)
+        self._vertex_layout = kwargs.get("vertex_layout", Actor.VertexLayout.Planar)
+        # fields of an interleaved vertex, see interleave
+        self._vertex_dtype = None
+        self._material = kwargs["material"] if "material" in kwargs else Materials().material()
+        self._wireframe = kwargs["wireframe"] if "wireframe" in kwargs else Materials().material(
+            diffuse=(0.25, 0.25, 0.25))
         self._viewport = kwargs.get("viewport", (0.0, 0.0, 1.0, 1.0))
 
         self._name = kwargs.get("name", "Actor"+str(id(self)))
@@ -66,13 +90,19 @@ class Actor(QObject):
         self._ibo = QOpenGLBuffer(QOpenGLBuffer.IndexBuffer)
         self._num_vertices = 0
         self._num_indices = 0
+        self._index_type = GL.GL_UNSIGNED_INT
+        # restore positions stored relative to the mesh bounds
+        self._position_scale = QVector3D(1.0, 1.0, 1.0)
+        self._position_offset = QVector3D(0.0, 0.0, 0.0)
+        # low and high corners of the box positions are quantized over
+        self._quantized_bounds = None
 
         self._hasNormals = False
         self._hasColors = False
         self._hasTextureCoords = False
         self._hasIndices = False
 
-        self._texture = None
+        self._texture = kwargs.get("texture")
 
         #self._bbox = None
         self._visible = True
@@ -81,21 +111,29 @@ class Actor(QObject):
         self._selectable = False
         self._selected = False
         self._highlighted = False
-        self._errorMaterial = Material.ruby()
+        self._errorMaterial = Materials().preset('ruby')
         self._errorHighlight = False
-        self._warningMaterial = Material.gold()
+        self._warningMaterial = Materials().preset('gold')
         self._warningHighlight = False
 
         self._pickFactor = 1.0
 
+        # box and sphere around the vertices, in object units, and their
+        # world counterparts, found again when the transform changes
+        self._local_bounds = None
+        self._local_sphere = None
+        self._world_bounds = None
+        self._world_sphere = None
+
     def update(self, **kwargs):
         """Update this node"""
         self._transform = kwargs.get("transform", QMatrix4x4())
+        self._world_bounds = self._world_sphere = None
         self._render_mode = kwargs.get("mode", Actor.RenderMode.Triangles)
         self._render_type = kwargs.get("type", Actor.RenderType.Solid)
-        self._material = kwargs.get("material", Material())
-        self._wireframe = kwargs.get("wireframe", Material(
-            diffuse=QVector3D(0.25, 0.25, 0.25)))
+        self._material = kwargs["material"] if "material" in kwargs else Materials().material()
+        self._wireframe = kwargs["wireframe"] if "wireframe" in kwargs else Materials().material(
+            diffuse=(0.25, 0.25, 0.25))
 
     def scene(self):
         return self._scene
@@ -116,6 +154,7 @@ class Actor(QObject):
 
     def setTransform(self, xform):
         self._transform = xform
+        self._world_bounds = self._world_sphere = None
 
     def transform(self):
         return self._transform
@@ -128,6 +167,41 @@ class Actor(QObject):
         # print("pos==",pos)
         self._transform = QMatrix4x4()
         self._transform.translate(pos.x(), pos.y(), pos.z())
+        self._world_bounds = self._world_sphere = None
+
+    def localBounds(self):
+        """Returns the low and high corners of the box around the vertices, in object units, or None"""
+        return self._local_bounds
+
+    def boundingSphere(self):
+        """Returns the center and radius of a sphere around the vertices, in object units, or None"""
+        return self._local_sphere
+
+    def worldBounds(self):
+        """Returns the low and high corners of the axis aligned box around the actor, in world units, or None"""
+        if self._world_bounds is None and self._local_bounds is not None:
+            self._world_bounds = transform_bounds(self._transform, *self._local_bounds)
+        return self._world_bounds
+
+    def worldSphere(self):
+        """Returns the center and radius of a sphere around the actor, in world units, or None"""
+        if self._world_sphere is None and self._local_sphere is not None:
+            self._world_sphere = transform_sphere(self._transform, *self._local_sphere)
+        return self._world_sphere
+
+    def findBounds(self, vertices):
+        """Finds the box and sphere around vertices, called by create and updateBuffer"""
+        positions = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        if len(positions) == 0:
+            self._local_bounds = self._local_sphere = None
+        else:
+            low = positions.min(axis=0).astype(np.float64)
+            high = positions.max(axis=0).astype(np.float64)
+            center = (low + high) / 2.0
+            radius = float(np.sqrt(((positions - center.astype(np.float32)) ** 2).sum(axis=1).max()))
+            self._local_bounds = (low, high)
+            self._local_sphere = (center, radius)
+        self._world_bounds = self._world_sphere = None
 
     def texture(self):
         """Returns the texture image"""
@@ -271,6 +345,11 @@ class Actor(QObject):
         """Returns the number of indices of this actor"""
         return self._num_indices
 
+    @property
+    def indexType(self):
+        """Returns the OpenGL type of the indices of this actor"""
+        return self._index_type
+
     def mapBuffer(self, offset, count, access):
         """Map the given buffer into a numpy array"""
         vbo_ptr = self._vbo.mapRange(offset, count, access)
@@ -286,24 +365,80 @@ class Actor(QObject):
 
     def updateBuffer(self, vertices=None, normals=None, colors=None, texcoords=None):
         """Update buffer with new data"""
+        if vertices is not None:
+            self.findBounds(vertices)
+        vertices, normals, colors, texcoords = self.encode(vertices, normals, colors, texcoords)
         self._vbo.bind()
+        if self._vertex_layout == Actor.VertexLayout.Interleaved:
+            # attributes are strided through the buffer, only their own bytes are written
+            data = self.mapBuffer(0, self._vbo.size(), QOpenGLBuffer.RangeWrite).view(self._vertex_dtype)
+            for name, values in (('position', vertices), ('normal', normals),
+                                 ('color', colors), ('texcoord', texcoords)):
+                if values is not None:
+                    data[name] = np.asarray(values).reshape(data[name].shape)
+            del data
+            self.unmapBuffer()
+        else:
+            if vertices is not None:
+                vertices = np.ascontiguousarray(vertices)
+                self._vbo.write(0, vertices, vertices.nbytes)
+                #buffer = self.mapBuffer(0, len(vertices), QOpenGLBuffer.RangeWrite | QOpenGLBuffer.RangeInvalidate)
+                #buffer[:len(vertices)] = vertices
+                # self.unmapBuffer()
+            if normals is not None:
+                normals = np.ascontiguousarray(normals)
+                self._vbo.write(self._offsetNormals, normals, normals.nbytes)
+            if colors is not None:
+                colors = np.ascontiguousarray(colors)
+                self._vbo.write(self._offsetColors, colors, colors.nbytes)
+            if texcoords is not None:
+                texcoords = np.ascontiguousarray(texcoords)
+                self._vbo.write(self._offsetTexCoords, texcoords, texcoords.nbytes)
+        self._vbo.release()
+
+    def vertexFormat(self):
+        """Returns the vertex format of this actor"""
+        return self._vertex_format
+
+    def vertexLayout(self):
+        """Returns the vertex layout of this actor"""
+        return self._vertex_layout
+
+    def encode(self, vertices=None, normals=None, colors=None, texcoords=None, bounds=False):
+        """Returns vertex attributes converted to the vertex format of this actor
+
+        Positions are placed within the bounds found by the last call with
+        bounds set, which create does."""
+        if self._vertex_format == Actor.VertexFormat.Float:
+            return vertices, normals, colors, texcoords
         if vertices is not None:
-            vertices = vertices.tostring()
-            #vertices = np.fromstring(vertices, dtype="uint8")
-            self._vbo.write(0, vertices, len(vertices))
-            #buffer = self.mapBuffer(0, len(vertices), QOpenGLBuffer.RangeWrite | QOpenGLBuffer.RangeInvalidate)
-            #buffer[:len(vertices)] = vertices
-            # self.unmapBuffer()
+            dtype = np.int16 if self._vertex_format == Actor.VertexFormat.Normalized else np.float16
+            if bounds:
+                vertices, scale, offset = quantize_positions(vertices, dtype)
+                self._position_scale = QVector3D(*scale.tolist())
+                self._position_offset = QVector3D(*offset.tolist())
+                self._quantized_bounds = (offset.astype(np.float64) - scale, offset.astype(np.float64) + scale)
+            else:
+                scale = np.array([self._position_scale[k] for k in range(3)], dtype=np.float32)
+                offset = np.array([self._position_offset[k] for k in range(3)], dtype=np.float32)
+                vertices = quantize_positions(vertices, dtype, scale, offset)[0]
         if normals is not None:
-            normals = normals.tostring()
-            self._vbo.write(self._offsetNormals, normals, len(normals))
-        if colors is not None:
-            colors = colors.tostring()
-            self._vbo.write(self._offsetColors, colors, len(colors))
+            normals = pack_normals(normals)
         if texcoords is not None:
-            texcoords = texcoords.tostring()
-            self._vbo.write(self._offsetTexCoords, texcoords, len(texcoords))
-        self._vbo.release()
+            texcoords = np.asarray(texcoords, dtype=np.float16)
+        return vertices, normals, colors, texcoords
+
+    def attributeFormats(self):
+        """Returns the OpenGL type, tuple size and stride of positions, normals and texcoords
+
+        Qt reads integer attributes normalized, so int16 positions span
+        [-1, 1] over the mesh bounds and packed normals are unit vectors."""
+        float_size = np.dtype(np.float32).itemsize
+        if self._vertex_format == Actor.VertexFormat.Float:
+            return ((GL.GL_FLOAT, 3, 3 * float_size), (GL.GL_FLOAT, 3, 3 * float_size),
+                    (GL.GL_FLOAT, 2, 2 * float_size))
+        position = GL.GL_SHORT if self._vertex_format == Actor.VertexFormat.Normalized else GL.GL_HALF_FLOAT
+        return ((position, 3, 8), (GL.GL_INT_2_10_10_10_REV, 4, 4), (GL.GL_HALF_FLOAT, 2, 4))
 
     def create(self, vertices, normals=None, colors=None, texcoords=None, indices=None, usage=QOpenGLBuffer.StaticDraw):
         """Create object vertex arrays and buffers"""
@@ -312,40 +447,46 @@ class Actor(QObject):
         shaders = [self._solid_shader, self._wireframe_shader,
                    self._nolight_solid_shader, self._nolight_wireframe_shader]
 
+        self.findBounds(vertices)
+
         # bind vao
         self._vao.create()
         self._vao.bind()
 
-        # define total sizes
-        vertices = vertices.tostring()
-        total_vertices = len(vertices)
+        # define total sizes, arrays are handed to the buffer through the
+        # buffer protocol so memory-mapped data is never copied in Python
+        self._num_vertices = len(np.asarray(vertices).reshape(-1, 3))
+        vertices, normals, colors, texcoords = self.encode(
+            vertices, normals, colors, texcoords, bounds=True)
+        position_format, normal_format, texcoord_format = self.attributeFormats()
+        vertices = np.ascontiguousarray(vertices)
+        total_vertices = vertices.nbytes
         total_normals = 0
         total_colors = 0
         total_texcoords = 0
-        self._num_vertices = total_vertices // (
-            np.dtype(np.float32).itemsize * 3)
         #print('total vertices=', self._num_vertices)
 
         if normals is not None:
             self._hasNormals = True
-            normals = normals.tostring()
-            total_normals = len(normals)
+            normals = np.ascontiguousarray(normals)
+            total_normals = normals.nbytes
 
         if colors is not None:
             self._hasColors = True
-            colors = colors.tostring()
-            total_colors = len(colors)
+            colors = np.ascontiguousarray(colors)
+            total_colors = colors.nbytes
 
         if texcoords is not None:
             self._hasTextureCoords = True
-            texcoords = texcoords.tostring()
-            total_texcoords = len(texcoords)
+            texcoords = np.ascontiguousarray(texcoords)
+            total_texcoords = texcoords.nbytes
 
         if indices is not None:
             self._hasIndices = True
-            indices = indices.tostring()
-            total_indices = len(indices)
-            self._num_indices = total_indices // np.dtype(np.uint32).itemsize
+            self._index_type = GL.GL_UNSIGNED_SHORT if indices.dtype == np.uint16 else GL.GL_UNSIGNED_INT
+            indices = np.ascontiguousarray(indices)
+            total_indices = indices.nbytes
+            self._num_indices = indices.size
             #print('total indices=', self._num_indices)
 
         # create vertex buffer object
@@ -354,36 +495,51 @@ class Actor(QObject):
         self._vbo.bind()
 
         # populate vertex buffer object with data
-        offset = 0
-        self._vbo.allocate(total_vertices + total_normals +
-                           total_colors + total_texcoords)
-        self._vbo.write(offset, vertices, total_vertices)
-        for each in shaders:
-            each.setAttributeBuffer(
-                'position', GL.GL_FLOAT, offset, 3, 3 * np.dtype(np.float32).itemsize)
-        offset += total_vertices
-        self._offsetNormals = offset
-
-        if self._hasNormals:
-            self._vbo.write(offset, normals, total_normals)
-            for each in shaders:
-                each.setAttributeBuffer(
-                    'normal', GL.GL_FLOAT, offset, 3, 3 * np.dtype(np.float32).itemsize)
-            offset += total_normals
-        if self._hasColors:
-            self._offsetColors = offset
-            self._vbo.write(offset, colors, total_colors)
-            for each in shaders:
-                each.setAttributeBuffer(
-                    'color', GL.GL_FLOAT, offset, 3, 3 * np.dtype(np.float32).itemsize)
-            offset += total_colors
-        if self._hasTextureCoords:
-            self._offsetTexCoords = offset
-            self._vbo.write(offset, texcoords, total_texcoords)
+        if self._vertex_layout == Actor.VertexLayout.Interleaved:
+            # one copy into a structured array lays every vertex out whole,
+            # its fields giving the offsets and its item size the stride
+            data = interleave(*(None if values is None else values.reshape(self._num_vertices, -1)
+                                for values in (vertices, normals, colors, texcoords)))
+            self._vertex_dtype = data.dtype
+            self._vbo.allocate(data.nbytes)
+            self._vbo.write(0, data, data.nbytes)
+            formats = {'position': position_format[:2], 'normal': normal_format[:2],
+                       'color': (GL.GL_FLOAT, 3), 'texcoord': texcoord_format[:2]}
+            for name in data.dtype.names:
+                for each in shaders:
+                    each.setAttributeBuffer(name, formats[name][0], data.dtype.fields[name][1],
+                                            formats[name][1], data.dtype.itemsize)
+        else:
+            offset = 0
+            self._vbo.allocate(total_vertices + total_normals +
+                               total_colors + total_texcoords)
+            self._vbo.write(offset, vertices, total_vertices)
             for each in shaders:
                 each.setAttributeBuffer(
-                    'texcoord', GL.GL_FLOAT, offset, 2, 2 * np.dtype(np.float32).itemsize)
-            offset += total_texcoords
+                    'position', position_format[0], offset, position_format[1], position_format[2])
+            offset += total_vertices
+            self._offsetNormals = offset
+
+            if self._hasNormals:
+                self._vbo.write(offset, normals, total_normals)
+                for each in shaders:
+                    each.setAttributeBuffer(
+                        'normal', normal_format[0], offset, normal_format[1], normal_format[2])
+                offset += total_normals
+            if self._hasColors:
+                self._offsetColors = offset
+                self._vbo.write(offset, colors, total_colors)
+                for each in shaders:
+                    each.setAttributeBuffer(
+                        'color', GL.GL_FLOAT, offset, 3, 3 * np.dtype(np.float32).itemsize)
+                offset += total_colors
+            if self._hasTextureCoords:
+                self._offsetTexCoords = offset
+                self._vbo.write(offset, texcoords, total_texcoords)
+                for each in shaders:
+                    each.setAttributeBuffer(
+                        'texcoord', texcoord_format[0], offset, texcoord_format[1], texcoord_format[2])
+                offset += total_texcoords
 
         # release buffer
         self._vbo.release(QOpenGLBuffer.VertexBuffer)
@@ -417,6 +573,31 @@ class Actor(QObject):
         if self._hasIndices:
             self._ibo.release(QOpenGLBuffer.IndexBuffer)
 
+    def share(self, actor):
+        """Draws the vertex arrays and buffers of another actor instead of creating new ones"""
+        self._vao = actor._vao
+        self._vbo = actor._vbo
+        self._ibo = actor._ibo
+        self._num_vertices = actor._num_vertices
+        self._num_indices = actor._num_indices
+        self._index_type = actor._index_type
+        self._vertex_format = actor._vertex_format
+        self._vertex_layout = actor._vertex_layout
+        self._vertex_dtype = actor._vertex_dtype
+        self._position_scale = actor._position_scale
+        self._position_offset = actor._position_offset
+        self._quantized_bounds = actor._quantized_bounds
+        self._hasNormals = actor._hasNormals
+        self._hasColors = actor._hasColors
+        self._hasTextureCoords = actor._hasTextureCoords
+        self._hasIndices = actor._hasIndices
+        self._local_bounds = actor._local_bounds
+        self._local_sphere = actor._local_sphere
+        self._world_bounds = self._world_sphere = None
+        for offset in ('_offsetNormals', '_offsetColors', '_offsetTexCoords'):
+            if hasattr(actor, offset):
+                setattr(self, offset, getattr(actor, offset))
+
     def setUniformBindings(self, wireframe=False):
         """Sets up uniform shader bindings"""
         normalMatrix = self._transform.normalMatrix()
@@ -426,6 +607,8 @@ class Actor(QObject):
         self._active_shader.setUniformValue(
             "projectionMatrix", self._scene.camera.projectionMatrix)
         self._active_shader.setUniformValue("normalMatrix", normalMatrix)
+        self._active_shader.setUniformValue("positionScale", self._position_scale)
+        self._active_shader.setUniformValue("positionOffset", self._position_offset)
         if self.texture() is not None:
             self._active_shader.setUniformValue("texObject", 0)
 
@@ -576,37 +759,27 @@ class Actor(QObject):
         self._pickFactor = value
 
     def intersect(self, ray):
-        """Returns intersection if any"""
-        tMin = -math.inf
-        tMax = math.inf
-        obb_xform = self.transform()
-        obb_center = QVector3D(
-            obb_xform[0, 3], obb_xform[1, 3], obb_xform[2, 3])
-        point = obb_center - ray.origin()
-        for i in range(3):
-            axis = QVector3D(
-                obb_xform[0, i], obb_xform[1, i], obb_xform[2, i]).normalized()
-            half_length = QVector3D(
-                obb_xform[i, 0], obb_xform[i, 1], obb_xform[i, 2]).length() / 2.0
-            e = QVector3D.dotProduct(axis, point)
-            f = QVector3D.dotProduct(axis, ray.direction())
-            if abs(f) > 10E-6:
-                t1 = (e + half_length*self._pickFactor) / f
-                t2 = (e - half_length*self._pickFactor) / f
-                if t1 > t2:
-                    w = t1
-                    t1 = t2
-                    t2 = w
-                if t1 > tMin:
-                    tMin = t1
-                if t2 < tMax:
-                    tMax = t2
-                if tMin > tMax:
-                    return (False, math.inf)
-                if tMax < 0:
-                    return (False, math.inf)
-            elif -e-half_length > 0.0 or -e+half_length < 0.0:
-                return (False, math.inf)
-        if tMin > 0:
-            return (True, tMin)
-        return (True, tMax)
+        """Returns whether and where the ray hits the box around the vertices, as (hit, t)
+
+        The box is the one of localBounds, oriented by the transform and
+        grown by the pick factor around its center."""
+        if self._local_bounds is None:
+            return (False, math.inf)
+        low, high = self._local_bounds
+        center, half = (low + high) / 2.0, (high - low) / 2.0 * self._pickFactor
+        return ray.intersectBox(center - half, center + half, self._transform)
+
+
+def transform_bounds(xform, low, high):
+    """Returns the corners of the axis aligned box around a box placed by a transform"""
+    matrix = np.array(xform.data(), dtype=np.float64).reshape(4, 4).T
+    center = matrix[:3, :3] @ ((low + high) / 2.0) + matrix[:3, 3]
+    half = np.abs(matrix[:3, :3]) @ ((high - low) / 2.0)
+    return (center - half, center + half)
+
+
+def transform_sphere(xform, center, radius):
+    """Returns the center and radius of a sphere around a sphere placed by a transform"""
+    matrix = np.array(xform.data(), dtype=np.float64).reshape(4, 4).T
+    scale = float(np.linalg.norm(matrix[:3, :3], axis=0).max())
+    return (matrix[:3, :3] @ center + matrix[:3, 3], radius * scale)
@@ -119,9 +119,11 @@ class AxisMarker(Group):
                 part.setHighlighted(True)
 
     def set_rotation(self, quat):
-        self.findPartByName('x-axis circle').transform().rotate(quat)
-        self.findPartByName('y-axis circle').transform().rotate(quat)
-        self.findPartByName('z-axis circle').transform().rotate(quat)
+        for name in ('x-axis circle', 'y-axis circle', 'z-axis circle'):
+            part = self.findPartByName(name)
+            xform = part.transform()
+            xform.rotate(quat)
+            part.setTransform(xform)
 
     def setTransform(self, xform):
         self._transform = xform
@@ -0,0 +1,125 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from wavefront import mtllib_paths, BLOCK_SIZE
+
+# Notices edits of loaded Wavefront files by polling, so nothing but Qt is
+# needed. A file whose modification time or size changes is read again and
+# only reported when its contents did change, so saving without edits or
+# touching a file does not trigger a reload. Files are hashed in a worker
+# thread, hashlib releasing the GIL, so saving a large file never stalls
+# rendering.
+
+
+def digest(path):
+    """Returns the SHA-1 of the contents of a file, read in blocks"""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class FileWatcher(QObject):
+
+    changed = pyqtSignal(str)
+    _hashed = pyqtSignal(str, object, object)
+
+    # initialization
+    def __init__(self, parent=None, **kwargs):
+        """Initialize watcher."""
+        super(FileWatcher, self).__init__(parent)
+
+        self._interval = kwargs.get("interval", 500)
+        # watched OBJ files, each mapping its files and their libraries to
+        # their modification time, size and digest
+        self._files = {}
+        # files being hashed in the background
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.poll)
+
+        # digests arrive on the worker thread, hop to the thread owning the watcher
+        self._hashed.connect(self._update)
+
+    def watch(self, filename):
+        """Watches an OBJ file and its material libraries, polling while anything is watched"""
+        filename = os.path.abspath(filename)
+        if filename not in self._files:
+            # compared against once its first state is known
+            self._files[filename] = None
+            self._submit(filename, None)
+        if not self._timer.isActive():
+            self._timer.start(self._interval)
+
+    def unwatch(self, filename):
+        """Stops watching an OBJ file"""
+        self._files.pop(os.path.abspath(filename), None)
+        if not self._files:
+            self._timer.stop()
+
+    def files(self):
+        """Returns the OBJ files watched"""
+        return list(self._files)
+
+    def poll(self):
+        """Hashes again the watched files whose modification time or size changed
+
+        changed is emitted once the digests show their contents, or their
+        libraries', did change."""
+        for filename, state in list(self._files.items()):
+            if filename in self._pending:
+                continue
+            try:
+                if state is not None and \
+                        all(self._stat(path) == stat for path, (stat, _) in state.items()):
+                    continue
+            except OSError:
+                # being written or replaced, look again on the next poll
+                continue
+            self._submit(filename, state)
+
+    def _submit(self, filename, previous):
+        """Finds the state of a file in the worker thread, delivered to _update"""
+        self._pending.add(filename)
+        future = self._executor.submit(self._state, filename, previous)
+        future.add_done_callback(lambda f: self._hashed.emit(
+            filename, None if f.exception() else f.result(), f.exception()))
+
+    def _update(self, filename, current, error):
+        """Records the state of a file, emitting changed when its digests differ from the last"""
+        self._pending.discard(filename)
+        if filename not in self._files:
+            # unwatched meanwhile
+            return
+        if error is not None:
+            # being written or replaced, look again on the next poll
+            return
+        state = self._files[filename]
+        self._files[filename] = current
+        if state is not None and {path: sha1 for path, (_, sha1) in current.items()} != \
+                {path: sha1 for path, (_, sha1) in state.items()}:
+            self.changed.emit(filename)
+
+    def _state(self, filename, previous=None):
+        """Returns the modification time, size and digest of an OBJ file and its libraries
+
+        Digests of files whose time and size are unchanged are taken from previous."""
+        previous = previous or {}
+        paths = [filename] + [path for path in mtllib_paths(filename) if os.path.exists(path)]
+        state = {}
+        for path in paths:
+            stat = self._stat(path)
+            if path in previous and previous[path][0] == stat:
+                state[path] = previous[path]
+            else:
+                state[path] = (stat, digest(path))
+        return state
+
+    def _stat(self, path):
+        """Returns the modification time and size of a file"""
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
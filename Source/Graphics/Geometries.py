@@ -0,0 +1,162 @@
+import weakref
+import numpy as np
+
+from PyQt5.QtGui import QOpenGLBuffer
+
+# floats per instance: model matrix, normal matrix, highlight and selection
+INSTANCE_FLOATS = 16 + 9 + 2
+
+## singleton registry of loaded geometry
+
+
+class Geometry():
+    """Parts uploaded for one load of a file, shared by every object showing it
+
+    levels holds the geometry itself followed by its simplified levels, each
+    with the error of its parts."""
+
+    def __init__(self, parts, byte_counts, error=0.0):
+        self.parts = parts
+        self.byte_counts = byte_counts
+        self.error = error
+        # average cache miss ratio of the parts before and after reordering
+        self.acmr = None
+        # degenerate and duplicate triangles and unused vertices dropped by the cleanup
+        self.removed = None
+        self.levels = [self]
+        self._bounds = None
+        self._sphere = None
+        self.users = weakref.WeakSet()
+        # weak references to the instances in the buffer, which hold their geometry
+        self._instances = []
+        self._instance_data = None
+        self._instance_rows = {}
+        self._instance_buffer = None
+        self._stale = weakref.WeakSet()
+        self._dirty = True
+
+    def bounds(self):
+        """Returns the corners of the box around the parts, in object units"""
+        if self._bounds is None:
+            boxes = [part.localBounds() for part in self.parts if part.localBounds() is not None]
+            if boxes:
+                self._bounds = (np.min([low for low, high in boxes], axis=0),
+                                np.max([high for low, high in boxes], axis=0))
+            else:
+                self._bounds = (np.zeros(3), np.zeros(3))
+        return self._bounds
+
+    def sphere(self):
+        """Returns the center and radius of a sphere around the parts, in object units"""
+        if self._sphere is None:
+            low, high = self.bounds()
+            center = (low + high) / 2.0
+            vertices = [part.vertices() for part in self.parts if len(part.vertices())]
+            radius = max((float(np.linalg.norm(each - center, axis=1).max()) for each in vertices),
+                         default=0.0)
+            self._sphere = (center, radius)
+        return self._sphere
+
+    def invalidate(self, user=None):
+        """Marks the instance data of a user out of date, or all of it without a user"""
+        if user is None:
+            self._dirty = True
+        else:
+            self._stale.add(user)
+
+    def instanceData(self, instances):
+        """Returns the per-instance attributes of objects showing this geometry
+
+        Every row holds the model matrix and the normal matrix, both column
+        major, followed by the highlight and selection flags."""
+        data = np.empty((len(instances), INSTANCE_FLOATS), dtype=np.float32)
+        for row, instance in zip(data, instances):
+            self.instanceRow(instance, row)
+        return data
+
+    def instanceRow(self, instance, row):
+        """Fills the row of instanceData describing an instance"""
+        xform = instance.transform()
+        row[0:16] = xform.data()
+        row[16:25] = xform.normalMatrix().data()
+        row[25] = instance.isHighlighted()
+        row[26] = instance.isSelectable() and instance.isSelected()
+
+    def renderInstanced(self, instances, shading):
+        """Draws every part once for all instances, rewriting only the instances that changed"""
+        if self._instance_buffer is None:
+            self._instance_buffer = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+            self._instance_buffer.setUsagePattern(QOpenGLBuffer.DynamicDraw)
+            self._instance_buffer.create()
+
+        references = [weakref.ref(each) for each in instances]
+        if self._dirty or references != self._instances:
+            data = self.instanceData(instances)
+            self._instance_buffer.bind()
+            self._instance_buffer.allocate(data, data.nbytes)
+            self._instance_buffer.release()
+            self._instances = references
+            self._instance_data = data
+            self._instance_rows = {id(each): index for index, each in enumerate(instances)}
+            self._dirty = False
+        elif len(self._stale) > 0:
+            self._instance_buffer.bind()
+            for user in self._stale:
+                index = self._instance_rows.get(id(user))
+                if index is not None:
+                    row = self._instance_data[index]
+                    self.instanceRow(user, row)
+                    self._instance_buffer.write(index * row.nbytes, row, row.nbytes)
+            self._instance_buffer.release()
+        self._stale.clear()
+
+        for part in self.parts:
+            part.renderInstanced(len(instances), shading, self._instance_buffer)
+
+
+class Geometries():
+
+    __instance = None
+
+    def __new__(cls):
+        if Geometries.__instance is None:
+            Geometries.__instance = object.__new__(cls)
+            Geometries.__instance.initialize()
+        return Geometries.__instance
+
+    def initialize(self):
+        """Create empty registry"""
+        # entries go away with the last object referencing them
+        self._geometries = weakref.WeakValueDictionary()
+
+    def get(self, key):
+        """Returns the geometry loaded with a key, or None"""
+        return self._geometries.get(key)
+
+    def acquire(self, key, user):
+        """Returns the geometry loaded with a key, now also used by user, or None"""
+        geometry = self._geometries.get(key)
+        if geometry is not None:
+            geometry.users.add(user)
+        return geometry
+
+    def add(self, key, user, parts, byte_counts, levels=(), acmr=None, removed=None):
+        """Registers the parts of a new load, used by user, returning their geometry
+
+        levels are the (parts, error) pairs of its simplified levels."""
+        geometry = Geometry(parts, byte_counts)
+        geometry.acmr = acmr
+        geometry.removed = removed
+        geometry.levels.extend(Geometry(each, byte_counts, error) for each, error in levels)
+        geometry.users.add(user)
+        self._geometries[key] = geometry
+        return geometry
+
+    def references(self, key):
+        """Returns how many objects use the geometry of a key"""
+        geometry = self._geometries.get(key)
+        return 0 if geometry is None else len(geometry.users)
+
+    def count(self):
+        """Returns the number of geometries alive"""
+        return len(self._geometries)
@@ -1,3 +1,5 @@
+import math
+import numpy as np
 from collections import OrderedDict
 from PyQt5.QtCore import QObject
 
@@ -108,3 +110,54 @@ class Group(QObject):
         """Add a part to the group"""
         self._parts[part.name] = part
 
+
+    def localBounds(self):
+        """Returns the corners of the box around the parts, in the units they share, or None"""
+        return union_bounds([part.localBounds() for part in self.parts])
+
+
+    def boundingSphere(self):
+        """Returns the center and radius of a sphere around the parts, in the units they share, or None"""
+        bounds = self.localBounds()
+        if bounds is None:
+            return None
+        center = (bounds[0] + bounds[1]) / 2.0
+        spheres = [part.boundingSphere() for part in self.parts]
+        return (center, max(float(np.linalg.norm(each[0] - center)) + each[1]
+                            for each in spheres if each is not None))
+
+
+    def worldBounds(self):
+        """Returns the corners of the axis aligned box around the parts, in world units, or None"""
+        return union_bounds([part.worldBounds() for part in self.parts])
+
+
+    def worldSphere(self):
+        """Returns the center and radius of a sphere around the parts, in world units, or None"""
+        spheres = [each for each in (part.worldSphere() for part in self.parts) if each is not None]
+        if not spheres:
+            return None
+        bounds = self.worldBounds()
+        center = (bounds[0] + bounds[1]) / 2.0
+        return (center, max(float(np.linalg.norm(each[0] - center)) + each[1] for each in spheres))
+
+
+    def intersect(self, ray):
+        """Returns whether and where the ray hits the closest part, as (hit, t)
+
+        Parts are only tested when the ray hits the box around all of them."""
+        bounds = self.worldBounds()
+        if bounds is None or not ray.intersectBox(*bounds)[0]:
+            return (False, math.inf)
+        distance = min((t for hit, t in (part.intersect(ray) for part in self.parts) if hit),
+                       default=math.inf)
+        return (distance < math.inf, distance)
+
+
+def union_bounds(bounds):
+    """Returns the corners of the box around boxes, skipping None, or None"""
+    bounds = [each for each in bounds if each is not None]
+    if not bounds:
+        return None
+    return (np.min([low for low, high in bounds], axis=0), np.max([high for low, high in bounds], axis=0))
+
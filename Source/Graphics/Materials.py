@@ -0,0 +1,76 @@
+import weakref
+from PyQt5.QtGui import QVector3D
+from Source.Graphics.Material import Material
+
+## singleton registry of materials
+
+
+class Materials():
+
+    __instance = None
+
+    def __new__(cls):
+        if Materials.__instance is None:
+            Materials.__instance = object.__new__(cls)
+            Materials.__instance.initialize()
+        return Materials.__instance
+
+    def initialize(self):
+        """Create empty registry"""
+        # entries go away with the last actor using them
+        self._materials = weakref.WeakValueDictionary()
+        self._indices = weakref.WeakKeyDictionary()
+        self._created = 0
+        self._presets = {}
+        self._lookups = 0
+
+    def material(self, emission=(0.0, 0.0, 0.0), ambient=(0.2, 0.2, 0.2),
+                 diffuse=(0.8, 0.8, 0.8), specular=(0.0, 0.0, 0.0), shininess=12.0):
+        """Returns the material shared by everyone asking for these parameters"""
+        key = self.key(emission, ambient, diffuse, specular, shininess)
+        material = self._materials.get(key)
+        if material is None:
+            material = Material(emission=QVector3D(*emission), ambient=QVector3D(*ambient),
+                                diffuse=QVector3D(*diffuse), specular=QVector3D(*specular),
+                                shininess=shininess)
+            self._indices[material] = self._created
+            self._created += 1
+            self._materials[key] = material
+        self._lookups += 1
+        return material
+
+    def preset(self, name):
+        """Returns the shared copy of a predefined material, such as ruby"""
+        if name not in self._presets:
+            self._presets[name] = self.parameters(getattr(Material, name)())
+        return self.material(*self._presets[name])
+
+    def key(self, emission, ambient, diffuse, specular, shininess):
+        """Returns the dictionary key of material parameters"""
+        values = list(emission) + list(ambient) + \
+            list(diffuse) + list(specular) + [shininess]
+        return tuple(round(float(value), 6) for value in values)
+
+    def parameters(self, material):
+        """Returns the parameters of a material as tuples"""
+        def rgb(color):
+            return (color.x(), color.y(), color.z())
+        return (rgb(material.emissionColor), rgb(material.ambientColor),
+                rgb(material.diffuseColor), rgb(material.specularColor),
+                material.shininess)
+
+    def index(self, material):
+        """Returns the order of a material in the registry, for sorting draws"""
+        return self._indices.get(material, self._created)
+
+    def count(self):
+        """Returns the number of distinct materials in use"""
+        return len(self._materials)
+
+    def lookups(self):
+        """Returns how many times materials were asked for"""
+        return self._lookups
+
+    def clear(self):
+        """Forget every material"""
+        self.initialize()
@@ -0,0 +1,136 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from parser import load_shared_meshes, attach_shared_meshes
+from meshcache import MeshCache
+from wavefront import is_obj
+
+# Parses Wavefront files in worker processes, so neither the parsing nor the
+# GIL ever blocks the render thread. Workers store their meshes in the mesh
+# cache, which is then only memory-mapped here, and hand them back through
+# shared memory when it cannot hold them. Results are delivered through
+# queued signals, leaving every OpenGL upload to the thread that owns the
+# context.
+
+
+class ObjectLoader(QObject):
+
+    loaded = pyqtSignal(str, object, object)
+    reloaded = pyqtSignal(str, object, object)
+    batchLoaded = pyqtSignal(object, float, float)
+    failed = pyqtSignal(str, str)
+    progress = pyqtSignal(int, int)
+    _ready = pyqtSignal(object, object, str, object, object)
+
+    # initialization
+    def __init__(self, parent=None, **kwargs):
+        """Initialize loader."""
+        super(ObjectLoader, self).__init__(parent)
+
+        self._workers = kwargs.get("workers", os.cpu_count() or 1)
+        self._cache = kwargs.get("cache", MeshCache())
+        # keyword arguments of the Parser reading every file
+        self._parser_options = kwargs.get("parser_options", {})
+        self._executor = None
+        self._total = 0
+        self._done = 0
+
+        # results arrive on pool threads, hop to the thread owning the loader
+        self._ready.connect(self._deliver)
+
+    def executor(self):
+        """Returns the worker pool, starting it on first use"""
+        if self._executor is None:
+            # never fork a process holding Qt and OpenGL state
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def isLoading(self):
+        """Returns whether there are files being parsed"""
+        return self._done < self._total
+
+    def load(self, filename):
+        """Parses a file in the background, emitting loaded when done
+
+        loaded carries the filename, the meshes and the profile report of
+        the work done in the worker."""
+        self._submit(filename, None, self.loaded)
+
+    def reload(self, filename):
+        """Parses a changed file in the background, emitting reloaded when done
+
+        reloaded carries the same as loaded, for the objects showing the
+        file to be updated instead of a new one added."""
+        self._submit(filename, None, self.reloaded)
+
+    def loadDirectory(self, dirname):
+        """Parses every Wavefront file of a directory in parallel
+
+        Emits batchLoaded once with the (filename, meshes) pairs of all files,
+        the wall-clock time of the import and the sum of the time each file
+        took in its worker, i.e. the time a serial import would take."""
+        filenames = sorted(os.path.join(dirname, name) for name in os.listdir(dirname)
+                           if is_obj(name) and os.path.isfile(os.path.join(dirname, name)))
+        batch = {'pending': len(filenames), 'results': [],
+                 'start': time.perf_counter(), 'serial': 0.0}
+        for filename in filenames:
+            self._submit(filename, batch, None)
+        return len(filenames)
+
+    def shutdown(self):
+        """Stops the workers, dropping files not yet parsed"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _submit(self, filename, batch, signal):
+        """Sends a file to the worker pool, its result goes to signal or to batch"""
+        self._total += 1
+        future = self.executor().submit(load_shared_meshes, filename, cache=self._cache,
+                                        **self._parser_options)
+        future.add_done_callback(lambda f: self._finished(batch, signal, filename, f))
+        self.progress.emit(self._done, self._total)
+
+    def _finished(self, batch, signal, filename, future):
+        """Called from a pool thread once a file is parsed"""
+        if not future.cancelled():
+            error = future.exception()
+            self._ready.emit(batch, signal, filename, None if error else future.result(), error)
+
+    def _claim(self, place):
+        """Returns the meshes handed back by a worker, as views of the cache or of shared memory
+
+        Meshes evicted from the cache meanwhile come back as None, for
+        WFObject to read them again."""
+        if place[0] == 'cache':
+            return self._cache.load(place[1])
+        return attach_shared_meshes(*place[1:])
+
+    def _deliver(self, batch, signal, filename, result, error):
+        """Publishes a result and the loading progress"""
+        self._done += 1
+        if error is None:
+            place, elapsed, report = result
+            meshes = self._claim(place)
+            if batch is None:
+                signal.emit(filename, meshes, report)
+            else:
+                batch['results'].append((filename, meshes))
+                batch['serial'] += elapsed
+        else:
+            self.failed.emit(filename, str(error))
+
+        if batch is not None:
+            batch['pending'] -= 1
+            if batch['pending'] == 0:
+                batch['results'].sort(key=lambda result: result[0])
+                self.batchLoaded.emit(batch['results'], time.perf_counter() - batch['start'],
+                                      batch['serial'])
+
+        if self._done >= self._total:
+            self._done = self._total = 0
+        self.progress.emit(self._done, self._total)
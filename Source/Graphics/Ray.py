@@ -32,3 +32,31 @@ class Ray(QObject):
     def setDirection(self, direction):
         """Sets the ray direction"""
         self._direction = direction
+
+    def intersectBox(self, low, high, xform=None):
+        """Returns whether and where the ray hits a box, as (hit, t)
+
+        The box spans the low and high corners, in the space xform takes to
+        world space when given, so it may be oriented. t is measured along
+        the direction of the ray in world units."""
+        origin = np.array([self._origin.x(), self._origin.y(), self._origin.z()])
+        direction = np.array([self._direction.x(), self._direction.y(), self._direction.z()])
+        if xform is not None:
+            inverse, invertible = xform.inverted()
+            if not invertible:
+                return (False, math.inf)
+            matrix = np.array(inverse.data(), dtype=np.float64).reshape(4, 4).T
+            origin = matrix[:3, :3] @ origin + matrix[:3, 3]
+            direction = matrix[:3, :3] @ direction
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t1 = (np.asarray(low) - origin) / direction
+            t2 = (np.asarray(high) - origin) / direction
+        # axes the ray runs parallel to only matter when it is outside the slab
+        parallel = np.abs(direction) < 1e-12
+        if np.any(parallel & ((origin < low) | (origin > high))):
+            return (False, math.inf)
+        near = np.where(parallel, -math.inf, np.minimum(t1, t2)).max()
+        far = np.where(parallel, math.inf, np.maximum(t1, t2)).min()
+        if near > far or far < 0:
+            return (False, math.inf)
+        return (True, float(near if near > 0 else far))
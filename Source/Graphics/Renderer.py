@@ -1,3 +1,4 @@
+import os
 import math
 import numpy as np
 import copy
@@ -11,7 +12,16 @@ from Source.Graphics.Scene import Scene
 from Source.Graphics.Gnomon import Gnomon
 from Source.Graphics.World import World
 from Source.Graphics.AxisMarker import AxisMarker
+from Source.Graphics.Actor import Actor
 from Source.Graphics.WFObject import WFObject
+from Source.Graphics.ObjectLoader import ObjectLoader
+from Source.Graphics.FileWatcher import FileWatcher
+from Source.Graphics.Materials import Materials
+from Source.Graphics.Geometries import Geometries
+from Source.Graphics.Textures import Textures
+from parser import Parser
+from wavefront import OBJ_EXTENSIONS
+from profiler import Profile, format_report
 
 
 class Renderer(QOpenGLWidget):
@@ -34,6 +44,12 @@ class Renderer(QOpenGLWidget):
         self._lighting = kwargs.get("lighting", True)
         self._antialiasing = kwargs.get("antialiasing", False)
         self._statistics = kwargs.get("statistics", True)
+        self._vertex_format = kwargs.get("vertex_format", Actor.VertexFormat.Float)
+        self._vertex_layout = kwargs.get("vertex_layout", Actor.VertexLayout.Planar)
+        self._import_report = kwargs.get("import_report", False)
+        self._hot_reload = kwargs.get("hot_reload", False)
+        # keyword arguments of the Parser reading every file, such as merge and chunk_size
+        self._parser_options = kwargs.get("parser_options", {})
 
         # define home orientation
         self._home_rotation = QQuaternion.fromAxisAndAngle(QVector3D(
@@ -46,6 +62,22 @@ class Renderer(QOpenGLWidget):
         # create main scene
         self._world = World(self, home_position=QVector3D(0, 0, 3.5))
 
+        # parse Wavefront files in the background
+        self._loader = ObjectLoader(self, parser_options=self._parser_options)
+        self._loader.loaded.connect(self._object_loaded)
+        self._loader.batchLoaded.connect(self._batch_loaded)
+        self._loader.failed.connect(self._object_failed)
+        self._loader.reloaded.connect(self._object_reloaded)
+
+        # parse loaded files again when they are edited, if asked to
+        self._watcher = None
+        if self._hot_reload:
+            self._watcher = FileWatcher(self)
+            self._watcher.changed.connect(self._loader.reload)
+
+        # draw textures as their images are decoded in the background
+        Textures().notifier.ready.connect(self.update)
+
         # do not animate
         self._animating = True
 
@@ -163,6 +195,10 @@ class Renderer(QOpenGLWidget):
     def setDrawStyle(self, style):
         self._draw_style = style
 
+    def objectLoader(self):
+        """Returns the background Wavefront loader"""
+        return self._loader
+
     def activeSceneCamera(self):
         """Returns main scene camera"""
         return self._world.camera
@@ -183,6 +219,9 @@ class Renderer(QOpenGLWidget):
     def renderScene(self):
         """Draw main scene"""
 
+        # a few decoded images are uploaded in every frame
+        Textures().newFrame()
+
         # set scene rotation
         self._world.camera.setRotation(self._trackball.rotation().inverted())
         self._gnomon.camera.setRotation(self._trackball.rotation().inverted())
@@ -442,13 +481,91 @@ class Renderer(QOpenGLWidget):
     def add_object(self):
         """Adiciona um objeto à cena"""
         filename, filetype = QFileDialog.getOpenFileName(
-            self, 'Open file', filter='WaveFront Object (*.obj)', options=QFileDialog.DontUseNativeDialog)
+            self, 'Open file', filter='WaveFront Object ({})'.format(
+                ' '.join('*' + extension for extension in OBJ_EXTENSIONS)),
+            options=QFileDialog.DontUseNativeDialog)
         if filename:
-            self.makeCurrent()
-            self._world.addActor(WFObject(self._world, filename=filename))
-            self.doneCurrent()
+            if Geometries().get(Parser(filename, **self._parser_options).geometry_key() +
+                                (self._vertex_format, self._vertex_layout)) is not None:
+                # already on the GPU, no need to read it again
+                self._object_loaded(filename, None)
+            else:
+                self._loader.load(filename)
+            self.setFocus()
+
+    # EP2
+    def add_directory(self):
+        """Adiciona à cena todos os objetos de um diretório"""
+        dirname = QFileDialog.getExistingDirectory(
+            self, 'Open directory', options=QFileDialog.DontUseNativeDialog)
+        if dirname:
+            self._loader.loadDirectory(dirname)
             self.setFocus()
 
+    # EP2
+    def _object_loaded(self, filename, meshes, report=None):
+        """Envia para a GPU um objeto lido em segundo plano"""
+        self.makeCurrent()
+        obj = WFObject(self._world, filename=filename, meshes=meshes,
+                       vertex_format=self._vertex_format, vertex_layout=self._vertex_layout,
+                       parser_options=self._parser_options,
+                       profile=Profile(report=report) if report is not None else None)
+        self._world.addActor(obj)
+        self.doneCurrent()
+        if self._watcher is not None:
+            self._watcher.watch(filename)
+        if self._import_report:
+            print("{}: {} -> {} bytes of vertex data".format(
+                filename, *obj.byteCounts()))
+            if obj.acmr() is not None:
+                print("{}: ACMR {:.3f} -> {:.3f}".format(filename, *obj.acmr()))
+            if obj.removed() and any(obj.removed().values()):
+                print("{}: removed {degenerate} degenerate and {duplicate} duplicate triangles, "
+                      "{unreferenced} unused vertices".format(filename, **obj.removed()))
+            print(format_report(obj.report(), filename))
+        self.update()
+
+    # EP2
+    def _batch_loaded(self, results, wall, serial):
+        """Envia para a GPU, de uma vez, os objetos de um diretório"""
+        self.makeCurrent()
+        for filename, meshes in results:
+            self._world.addActor(WFObject(self._world, filename=filename, meshes=meshes,
+                                          vertex_format=self._vertex_format,
+                                          vertex_layout=self._vertex_layout,
+                                          parser_options=self._parser_options))
+            if self._watcher is not None:
+                self._watcher.watch(filename)
+        self.doneCurrent()
+        if self._import_report:
+            print("Imported {} files in {:.2f} s (serial {:.2f} s, {:.1f}x speedup)".format(
+                len(results), wall, serial, serial / wall if wall > 0 else 1.0))
+            print("{} distinct materials in use, asked for {} times".format(
+                Materials().count(), Materials().lookups()))
+        self.update()
+
+    # EP2
+    def _object_reloaded(self, filename, meshes, report=None):
+        """Atualiza na GPU as partes alteradas dos objetos de um arquivo editado"""
+        objs = [actor for actor in self._world.actors() if isinstance(actor, WFObject) and
+                os.path.abspath(actor.filename()) == os.path.abspath(filename)]
+        if not objs:
+            self._watcher.unwatch(filename)
+            return
+        self.makeCurrent()
+        counts = [obj.reload(meshes, Profile(report=report) if report is not None else None)
+                  for obj in objs]
+        self.doneCurrent()
+        if self._import_report:
+            print("{}: reloaded, {} parts kept, {} updated and {} uploaded".format(filename, *counts[0]))
+        self.update()
+
+    # EP2
+    def _object_failed(self, filename, message):
+        """Informa a falha na leitura de um objeto"""
+        QMessageBox.warning(self, 'Open file',
+                            'Could not load {}:\n{}'.format(filename, message))
+
     # EP2
     def _get_near_obj(self, event):
         """Retorna o objeto mais próximo apontado pelo mouse"""
@@ -520,6 +637,7 @@ class Renderer(QOpenGLWidget):
             xform[1, 3] += delta
         elif self._axis_type == 'Z':
             xform[2, 3] += delta
+        self._selected_obj.setTransform(xform)
         self._axis_marker.update('translate')
 
     # EP2
@@ -528,6 +646,7 @@ class Renderer(QOpenGLWidget):
         quat = self.obj_trackball(event, state='move')
         xform = self._selected_obj.transform()
         xform.rotate(quat)
+        self._selected_obj.setTransform(xform)
         self._axis_marker.update('rotate')
 
     # EP2
@@ -543,6 +662,7 @@ class Renderer(QOpenGLWidget):
             xform.scale(1, 1, delta)
         elif self._axis_type == 'W':
             xform.scale(delta, delta, delta)
+        self._selected_obj.setTransform(xform)
         self._axis_marker.update('scale')
 
     # EP2
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 from PyQt5.QtCore import QObject
 from PyQt5.QtGui import QVector3D, QVector4D, QMatrix4x4, QQuaternion
@@ -46,6 +47,9 @@ class Scene(QObject):
         self._light = kwargs.get("light", None)
         self._lighting = kwargs.get("lighting", True)
         self._shading = kwargs.get("shading", Scene.Shading.Smooth)
+        self._level_view = None
+        self._level_actors = []
+        self._levels = None
 
     @property
     def name(self):
@@ -63,6 +67,9 @@ class Scene(QObject):
     def clear(self):
         """Clear actors from scene"""
         self._actors.clear()
+        # let go of the actors whose levels were picked, and their buffers
+        self._level_actors, self._levels = [], None
+        self._level_view = None
 
     def actor(self, index):
         """Returns an specified actor"""
@@ -344,9 +351,19 @@ class Scene(QObject):
         # clear buffers
         GL.glClear(GL.GL_DEPTH_BUFFER_BIT)
 
+        # objects far away draw simplified meshes
+        self.updateLevels()
+
+        # copies of the same geometry are drawn in one call per part
+        batches = self.instanceBatches()
+        batched = set(id(each) for instances in batches.values() for each in instances)
+
         for each in self.systemActors() + self.actors():
 
-            if isinstance(each, Background):
+            if id(each) in batched:
+                continue
+
+            elif isinstance(each, Background):
 
                 # render background
                 self.renderBackground(each)
@@ -362,3 +379,72 @@ class Scene(QObject):
 
                 # render second pass of the scene
                 self.renderSecondPass(each)
+
+        # batches are only made for solid drawing, without edges to offset
+        for geometry, instances in batches.items():
+            geometry.renderInstanced(instances, self.shading)
+
+    def invalidateLevels(self):
+        """Makes the next frame pick detail levels again, after an actor moved"""
+        self._level_view = None
+
+    def updateLevels(self, tolerance=1.0):
+        """Draws every actor with detail levels at the coarsest one off by at most tolerance pixels
+
+        The error of a level is projected at the point of the bounding sphere
+        of the actor closest to the camera. Levels are only picked again when
+        the view, the actors or their placement change."""
+        if self._viewer is None or self.camera is None:
+            return
+        view = self.camera.viewMatrix
+        key = (tuple(view.data()), self._viewer.height(), self.camera.lens,
+               self.camera.heightAngle, self.camera.height, len(self._actors))
+        if key == self._level_view:
+            return
+        self._level_view = key
+
+        actors = [each for each in self.actors() if hasattr(each, 'levelErrors')]
+        if not actors:
+            self._level_actors, self._levels = [], None
+            return
+        bounds = np.array([each.bounds() for each in actors], dtype=np.float64)
+        if self.camera.lens == Camera.Lens.Orthographic:
+            pixels = np.full(len(actors), self._viewer.height() / self.camera.height)
+        else:
+            view = np.array(key[0], dtype=np.float64).reshape(4, 4).T
+            eye = bounds[:, :3] @ view[:3, :3].T + view[:3, 3]
+            distance = np.maximum(np.linalg.norm(eye, axis=1) - bounds[:, 3],
+                                  self.camera.nearDistance)
+            pixels = self._viewer.height() / \
+                (2.0 * distance * math.tan(math.radians(self.camera.heightAngle / 2.0)))
+
+        errors = [each.levelErrors() for each in actors]
+        depth = max(len(each) for each in errors)
+        if any(len(each) != depth for each in errors):
+            errors = [each + (np.inf,) * (depth - len(each)) for each in errors]
+        errors = np.array(errors, dtype=np.float64)
+        levels = np.logical_and.accumulate(errors * pixels[:, None] <= tolerance, axis=1).sum(axis=1) - 1
+
+        # only actors changing level are touched when the actors are the same
+        changed = range(len(actors))
+        if actors == self._level_actors:
+            changed = np.nonzero(levels != self._levels)[0].tolist()
+        for index in changed:
+            actors[index].setLevel(int(levels[index]))
+        self._level_actors, self._levels = actors, levels
+
+    def instanceBatches(self):
+        """Returns the visible actors sharing a geometry, grouped by it
+
+        Only solid lit drawing is instanced, other styles draw every actor
+        on its own, as do actors with hidden parts."""
+        batches = OrderedDict()
+        if self._draw_style != Scene.DrawStyle.Solid or not self.lighting:
+            return batches
+        for each in self.actors():
+            geometry = getattr(each, 'geometry', None)
+            if geometry is not None and each.isVisible() and \
+                    all(part.isVisible() for part in each.parts):
+                batches.setdefault(geometry(), []).append(each)
+        return OrderedDict((geometry, instances) for geometry, instances in batches.items()
+                           if len(instances) > 1)
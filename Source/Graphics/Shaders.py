@@ -75,6 +75,60 @@ class Shaders(QObject):
 		self.__instance._texturedFlatShader.addShaderFromSourceCode(QOpenGLShader.Vertex, Shaders.texturedVertexFlatShader())
 		self.__instance._texturedFlatShader.addShaderFromSourceCode(QOpenGLShader.Fragment, Shaders.texturedFragmentFlatShader())
 		self.__instance._texturedFlatShader.link()	
+		## create instanced Phong mesh shaders, one draw for every copy of a mesh
+		self.__instance._uniformMaterialPhongInstancedShader = QOpenGLShaderProgram()
+		self.__instance._uniformMaterialPhongInstancedShader.addShaderFromSourceCode(QOpenGLShader.Vertex, Shaders.instancedVertexShader(Shaders.uniformMaterialPhongVertexShader()))
+		self.__instance._uniformMaterialPhongInstancedShader.addShaderFromSourceCode(QOpenGLShader.Fragment, Shaders.instancedFragmentShader(Shaders.uniformMaterialPhongFragmentShader()))
+		self.__instance._uniformMaterialPhongInstancedShader.link()
+		self.__instance._uniformMaterialPhongFlatInstancedShader = QOpenGLShaderProgram()
+		self.__instance._uniformMaterialPhongFlatInstancedShader.addShaderFromSourceCode(QOpenGLShader.Vertex, Shaders.instancedVertexShader(Shaders.uniformMaterialPhongVertexFlatShader()))
+		self.__instance._uniformMaterialPhongFlatInstancedShader.addShaderFromSourceCode(QOpenGLShader.Fragment, Shaders.instancedFragmentShader(Shaders.uniformMaterialPhongFragmentFlatShader()))
+		self.__instance._uniformMaterialPhongFlatInstancedShader.link()
+		self.__instance._attributeColorPhongInstancedShader = QOpenGLShaderProgram()
+		self.__instance._attributeColorPhongInstancedShader.addShaderFromSourceCode(QOpenGLShader.Vertex, Shaders.instancedVertexShader(Shaders.attributeMaterialPhongVertexShader()))
+		self.__instance._attributeColorPhongInstancedShader.addShaderFromSourceCode(QOpenGLShader.Fragment, Shaders.instancedFragmentShader(Shaders.attributeMaterialPhongFragmentShader()))
+		self.__instance._attributeColorPhongInstancedShader.link()
+		self.__instance._attributeColorPhongFlatInstancedShader = QOpenGLShaderProgram()
+		self.__instance._attributeColorPhongFlatInstancedShader.addShaderFromSourceCode(QOpenGLShader.Vertex, Shaders.instancedVertexShader(Shaders.attributeMaterialPhongVertexFlatShader()))
+		self.__instance._attributeColorPhongFlatInstancedShader.addShaderFromSourceCode(QOpenGLShader.Fragment, Shaders.instancedFragmentShader(Shaders.attributeMaterialPhongFragmentFlatShader()))
+		self.__instance._attributeColorPhongFlatInstancedShader.link()
+		self.__instance._texturedInstancedShader = QOpenGLShaderProgram()
+		self.__instance._texturedInstancedShader.addShaderFromSourceCode(QOpenGLShader.Vertex, Shaders.instancedVertexShader(Shaders.texturedVertexShader()))
+		self.__instance._texturedInstancedShader.addShaderFromSourceCode(QOpenGLShader.Fragment, Shaders.instancedFragmentShader(Shaders.texturedFragmentShader()))
+		self.__instance._texturedInstancedShader.link()
+		self.__instance._texturedFlatInstancedShader = QOpenGLShaderProgram()
+		self.__instance._texturedFlatInstancedShader.addShaderFromSourceCode(QOpenGLShader.Vertex, Shaders.instancedVertexShader(Shaders.texturedVertexFlatShader()))
+		self.__instance._texturedFlatInstancedShader.addShaderFromSourceCode(QOpenGLShader.Fragment, Shaders.instancedFragmentShader(Shaders.texturedFragmentFlatShader()))
+		self.__instance._texturedFlatInstancedShader.link()
+
+
+	@classmethod
+	def instancedVertexShader(cls, source):
+		"""Turns the model and normal matrices of a vertex shader into per-instance attributes
+
+		Locations 4 to 7 hold the model matrix columns, 8 to 10 the normal
+		matrix columns and 11 the highlight and selection flags, which are
+		passed on to the fragment shader."""
+		source = source.replace("uniform mat4 modelMatrix;", "layout(location = 4) in mat4 modelMatrix;")
+		source = source.replace("uniform mat3 normalMatrix;",
+			"layout(location = 8) in mat3 normalMatrix;\n\t\tlayout(location = 11) in vec2 instanceFlags;\n\t\tflat out vec2 flags;")
+		source = source.replace("gl_Position = projectionMatrix * vertexPosition;",
+			"gl_Position = projectionMatrix * vertexPosition;\n\t\t    flags = instanceFlags;")
+		return source
+
+
+	@classmethod
+	def instancedFragmentShader(cls, source):
+		"""Makes a Phong fragment shader highlight and select the instances flagged by instancedVertexShader
+
+		Highlighted instances glow like highlighted actors and selected ones
+		show their texture at full brightness."""
+		source = source.replace("out vec4 fragColor;", "flat in vec2 flags;\n\n\t\tout vec4 fragColor;")
+		source = source.replace("vec3 intensity = material.emission +",
+			"vec3 intensity = mix(material.emission, vec3(0.25, 0.25, 0.25), flags.x) +")
+		source = source.replace("uniform float selected;\n\t\t", "")
+		source = source.replace("vec4(selected * tex.rgb, 1.0)", "vec4(mix(0.65, 1.0, flags.y) * tex.rgb, 1.0)")
+		return source
 
 
 	@classmethod
@@ -82,6 +136,8 @@ class Shaders(QObject):
 		vertexShaderSource = """
 		#version 400
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		layout(location = 1) in vec3 normal;
 		uniform mat4 modelMatrix;
 		uniform mat4 viewMatrix;
@@ -97,7 +153,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    vertexPosition = viewMatrix * modelMatrix * vec4(position, 1.0);
+		    vertexPosition = viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexNormal = viewMatrix * vec4(normalMatrix * normal, 0.0);
 		    if (lightPosition.w == 0.0) {
 				lightDirection = normalize(lightPosition.xyz);
@@ -169,6 +225,8 @@ class Shaders(QObject):
 		vertexShaderSource = """
 		#version 400
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		layout(location = 1) in vec3 normal;
 		layout(location = 2) in vec3 color;
 		uniform mat4 modelMatrix;
@@ -186,7 +244,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    vertexPosition = viewMatrix * modelMatrix * vec4(position, 1.0);
+		    vertexPosition = viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexNormal = viewMatrix * vec4(normalMatrix * normal, 0.0);
 		    if (lightPosition.w == 0.0) {
 				lightDirection = normalize(lightPosition.xyz);
@@ -260,6 +318,8 @@ class Shaders(QObject):
 		vertexShaderSource = """
 		#version 400
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		layout(location = 1) in vec3 normal;
 		uniform mat4 modelMatrix;
 		uniform mat4 viewMatrix;
@@ -275,7 +335,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    vertexPosition = viewMatrix * modelMatrix * vec4(position, 1.0);
+		    vertexPosition = viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexNormal = viewMatrix * vec4(normalMatrix * normal, 0.0);
 		    if (lightPosition.w == 0.0) {
 				lightDirection = normalize(lightPosition.xyz);
@@ -347,6 +407,8 @@ class Shaders(QObject):
 		vertexShaderSource = """
 		#version 400
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		layout(location = 1) in vec3 normal;
 		layout(location = 2) in vec3 color;
 		uniform mat4 modelMatrix;
@@ -364,7 +426,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    vertexPosition = viewMatrix * modelMatrix * vec4(position, 1.0);
+		    vertexPosition = viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexNormal = viewMatrix * vec4(normalMatrix * normal, 0.0);
 		    if (lightPosition.w == 0.0) {
 				lightDirection = normalize(lightPosition.xyz);
@@ -464,6 +526,8 @@ class Shaders(QObject):
 		}; 
 
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		
 		uniform mat4 modelMatrix;
 		uniform mat4 viewMatrix;
@@ -474,7 +538,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(position, 1.0);
+		    gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexColor = vec4(material.diffuse, 1.0);
 		}
 		"""
@@ -486,6 +550,8 @@ class Shaders(QObject):
 		vertexShaderSource = """
 		#version 400
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		layout(location = 1) in vec3 normal;
 		layout(location = 2) in vec3 color;
 		layout(location = 3) in vec2 texcoord;
@@ -504,7 +570,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    vertexPosition = viewMatrix * modelMatrix * vec4(position, 1.0);
+		    vertexPosition = viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexNormal = viewMatrix * vec4(normalMatrix * normal, 0.0);
 		    if (lightPosition.w == 0.0) {
 				lightDirection = normalize(lightPosition.xyz);
@@ -526,6 +592,8 @@ class Shaders(QObject):
 		vertexShaderSource = """
 		#version 400
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		layout(location = 1) in vec3 normal;
 		layout(location = 2) in vec3 color;
 		layout(location = 3) in vec2 texcoord;
@@ -544,7 +612,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    vertexPosition = viewMatrix * modelMatrix * vec4(position, 1.0);
+		    vertexPosition = viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexNormal = viewMatrix * vec4(normalMatrix * normal, 0.0);
 		    if (lightPosition.w == 0.0) {
 				lightDirection = normalize(lightPosition.xyz);
@@ -575,6 +643,8 @@ class Shaders(QObject):
 		}; 
 
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		
 		uniform mat4 modelMatrix;
 		uniform mat4 viewMatrix;
@@ -585,7 +655,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(position, 1.0);
+		    gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexColor = vec4(wireframe_material.diffuse, 1.0);
 		}
 		"""
@@ -597,6 +667,8 @@ class Shaders(QObject):
 		vertexShaderSource = """
 		#version 400
 		layout(location = 0) in vec3 position;
+		uniform vec3 positionScale;
+		uniform vec3 positionOffset;
 		layout(location = 2) in vec3 color;
 		uniform mat4 modelMatrix;
 		uniform mat4 viewMatrix;
@@ -605,7 +677,7 @@ class Shaders(QObject):
 
 		void main()
 		{
-		    gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(position, 1.0);
+		    gl_Position = projectionMatrix * viewMatrix * modelMatrix * vec4(positionOffset + positionScale * position, 1.0);
 		    vertexColor = vec4(color, 1.0);
 		}
 		"""
@@ -777,3 +849,25 @@ class Shaders(QObject):
 		return self.__instance._texturedFlatShader
 
 
+	def uniformMaterialPhongInstancedShader(self):
+		return self.__instance._uniformMaterialPhongInstancedShader
+
+
+	def uniformMaterialPhongFlatInstancedShader(self):
+		return self.__instance._uniformMaterialPhongFlatInstancedShader
+
+
+	def attributeColorPhongInstancedShader(self):
+		return self.__instance._attributeColorPhongInstancedShader
+
+
+	def attributeColorPhongFlatInstancedShader(self):
+		return self.__instance._attributeColorPhongFlatInstancedShader
+
+
+	def texturedInstancedShader(self):
+		return self.__instance._texturedInstancedShader
+
+
+	def texturedFlatInstancedShader(self):
+		return self.__instance._texturedFlatInstancedShader
@@ -0,0 +1,200 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenGL import GL
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QOpenGLTexture
+
+
+def decode(path):
+    """Returns the mip levels of an image, largest first, flipped for OpenGL texcoords
+
+    Runs in a worker thread, QImage decoding and scaling release the GIL."""
+    image = QImage(path)
+    if image.isNull():
+        raise ValueError("Could not decode {}".format(path))
+    image = image.convertToFormat(QImage.Format_RGBA8888).mirrored()
+    levels = [image]
+    while image.width() > 1 or image.height() > 1:
+        image = image.scaled(max(image.width() // 2, 1), max(image.height() // 2, 1),
+                             Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        levels.append(image)
+    return levels
+
+
+class Texture():
+    """Image of a material, decoded in the background and uploaded on first use
+
+    Binding a texture not uploaded yet, or whose image could not be read,
+    binds a transparent texel, which the textured shaders show as the bare
+    material."""
+
+    def __init__(self, path):
+        self.path = path
+        self.failed = False
+        self._levels = None
+        self._texture = None
+        self._nbytes = 0
+        self._decoding = False
+
+    def isReady(self):
+        """Returns whether the image is on the GPU"""
+        return self._texture is not None
+
+    def nbytes(self):
+        """Returns the GPU memory taken by the image and its mipmaps"""
+        return self._nbytes
+
+    def bind(self, unit=0):
+        """Binds the image, or the fallback texel until it is uploaded"""
+        Textures().bind(self, unit)
+
+    def release(self, unit=0):
+        """Unbinds whatever bind bound"""
+        GL.glActiveTexture(GL.GL_TEXTURE0 + unit)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, 0)
+
+
+class TextureNotifier(QObject):
+    """Hops decoded images from the worker threads to the thread owning the textures"""
+
+    decoded = pyqtSignal(object, object, object)
+    ready = pyqtSignal()
+
+
+## singleton LRU cache of textures on the GPU
+
+
+class Textures():
+
+    __instance = None
+
+    def __new__(cls):
+        if Textures.__instance is None:
+            Textures.__instance = object.__new__(cls)
+            Textures.__instance.initialize()
+        return Textures.__instance
+
+    def initialize(self):
+        """Create empty cache"""
+        # every texture asked for by path, least recently used first
+        self._textures = OrderedDict()
+        self._resident = 0
+        self.max_bytes = 256 * 1024 * 1024
+        # images uploaded in one frame beyond the first, so loads never stall drawing
+        self.upload_bytes = 16 * 1024 * 1024
+        self._uploaded = 0
+        self._executor = None
+        self._fallback = None
+        # emits ready whenever an image can be drawn, so views can redraw
+        self.notifier = TextureNotifier()
+        self.notifier.decoded.connect(self._decoded)
+
+    def texture(self, path):
+        """Returns the texture of an image file, shared by everyone asking for the same file"""
+        key = os.path.normcase(os.path.realpath(path))
+        texture = self._textures.get(key)
+        if texture is None:
+            texture = self._textures[key] = Texture(key)
+        else:
+            self._textures.move_to_end(key)
+        self._decode(texture)
+        return texture
+
+    def bind(self, texture, unit=0):
+        """Binds a texture, uploading it when decoded and the frame budget allows"""
+        self._textures.move_to_end(texture.path)
+        if texture._texture is None and texture._levels is not None and \
+                (self._uploaded == 0 or self._uploaded + texture._nbytes <= self.upload_bytes):
+            self._upload(texture)
+        elif texture._texture is None:
+            self._decode(texture)
+        GL.glActiveTexture(GL.GL_TEXTURE0 + unit)
+        if texture._texture is not None:
+            texture._texture.bind()
+        else:
+            self.fallback().bind()
+
+    def newFrame(self):
+        """Resets the upload budget, called before drawing every frame"""
+        self._uploaded = 0
+
+    def fallback(self):
+        """Returns the transparent texel bound in place of images not ready"""
+        if self._fallback is None:
+            image = QImage(1, 1, QImage.Format_RGBA8888)
+            image.fill(Qt.transparent)
+            self._fallback = QOpenGLTexture(image, QOpenGLTexture.DontGenerateMipMaps)
+        return self._fallback
+
+    def residentBytes(self):
+        """Returns the GPU memory taken by uploaded images"""
+        return self._resident
+
+    def count(self):
+        """Returns the number of images on the GPU"""
+        return sum(1 for texture in self._textures.values() if texture.isReady())
+
+    def clear(self):
+        """Frees every uploaded image, needs the OpenGL context current"""
+        for texture in self._textures.values():
+            self._evict(texture)
+        if self._fallback is not None:
+            self._fallback.destroy()
+            self._fallback = None
+
+    def _decode(self, texture):
+        """Starts decoding a texture in the background, unless it is done or failed"""
+        if texture._texture is not None or texture._levels is not None or \
+                texture._decoding or texture.failed:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2)
+        texture._decoding = True
+        future = self._executor.submit(decode, texture.path)
+        future.add_done_callback(lambda f: self.notifier.decoded.emit(
+            texture, None if f.exception() else f.result(), f.exception()))
+
+    def _decoded(self, texture, levels, error):
+        """Keeps the levels of a decoded image until it is bound"""
+        texture._decoding = False
+        if error is not None:
+            texture.failed = True
+            print("{}: {}".format(texture.path, error))
+            return
+        texture._levels = levels
+        texture._nbytes = sum(level.sizeInBytes() for level in levels)
+        self.notifier.ready.emit()
+
+    def _upload(self, texture):
+        """Uploads the levels of a decoded image, evicting the least recently used ones"""
+        for other in list(self._textures.values()):
+            if self._resident + texture._nbytes <= self.max_bytes:
+                break
+            if other is not texture:
+                self._evict(other)
+
+        levels = texture._levels
+        gltexture = QOpenGLTexture(QOpenGLTexture.Target2D)
+        gltexture.setFormat(QOpenGLTexture.RGBA8_UNorm)
+        gltexture.setSize(levels[0].width(), levels[0].height())
+        gltexture.setMipLevels(len(levels))
+        gltexture.allocateStorage(QOpenGLTexture.RGBA, QOpenGLTexture.UInt8)
+        for level, image in enumerate(levels):
+            gltexture.setData(level, QOpenGLTexture.RGBA, QOpenGLTexture.UInt8, image.constBits())
+        gltexture.setMinMagFilters(QOpenGLTexture.LinearMipMapLinear, QOpenGLTexture.Linear)
+        gltexture.setWrapMode(QOpenGLTexture.Repeat)
+
+        # the images are on the GPU now, an evicted texture is decoded again
+        texture._texture = gltexture
+        texture._levels = None
+        self._resident += texture._nbytes
+        self._uploaded += texture._nbytes
+
+    def _evict(self, texture):
+        """Frees the GPU copy of a texture"""
+        if texture._texture is not None:
+            texture._texture.destroy()
+            texture._texture = None
+            self._resident -= texture._nbytes
@@ -1,23 +1,108 @@
+import ctypes
 import numpy as np
 
 from OpenGL import GL
 from Source.Graphics.Actor import Actor
+from Source.Graphics.Geometries import INSTANCE_FLOATS
 
 
 class WFOParts(Actor):
 
     # initialization
     def __init__(self, scene, **kwargs):
+        # a part of another object showing the same geometry
+        source = kwargs.get('source')
+        if source is not None:
+            kwargs.setdefault('material', source.material)
+            kwargs.setdefault('vertices', source._vertices)
+            kwargs.setdefault('normals', source._normals)
+            kwargs.setdefault('texcoords', source._texcoords)
+            kwargs.setdefault('colors', source._colors)
+            kwargs.setdefault('texture', source._texture)
+            kwargs.setdefault('indices', source._indices)
+            kwargs.setdefault('level', source._level)
+            kwargs.setdefault('error', source._error)
+
         super(WFOParts, self).__init__(
             scene, mode=Actor.RenderMode.Triangles, **kwargs)
 
+        self._source = source
+
         self._vertices = kwargs.get('vertices')
         self._normals = kwargs.get('normals')
         self._texcoords = kwargs.get('texcoords')
+        self._colors = kwargs.get('colors')
+        self._indices = kwargs.get('indices')
+        # detail level and its geometric error, in object units
+        self._level = kwargs.get('level', 0)
+        self._error = kwargs.get('error', 0.0)
+
+        # merged materials carry their diffuse color in every vertex
+        if self._texture is not None:
+            self.setSolidShader(self.shaderCollection.texturedShader())
+            self.setSolidFlatShader(self.shaderCollection.texturedFlatShader())
+            self._instanced_shader = self.shaderCollection.texturedInstancedShader()
+            self._instanced_flat_shader = self.shaderCollection.texturedFlatInstancedShader()
+        elif self._colors is not None:
+            self.setSolidShader(self.shaderCollection.attributeColorPhongShader())
+            self.setSolidFlatShader(self.shaderCollection.attributeColorPhongFlatShader())
+            self.setNoLightSolidShader(self.shaderCollection.attributeColorShader())
+            self._instanced_shader = self.shaderCollection.attributeColorPhongInstancedShader()
+            self._instanced_flat_shader = self.shaderCollection.attributeColorPhongFlatInstancedShader()
+        else:
+            self._instanced_shader = self.shaderCollection.uniformMaterialPhongInstancedShader()
+            self._instanced_flat_shader = self.shaderCollection.uniformMaterialPhongFlatInstancedShader()
 
         # create actor
         self.initialize()
 
+    def vertices(self):
+        """Returns the vertex positions of the part"""
+        return self._vertices
+
+    def level(self):
+        """Returns the detail level of the part, 0 for the full mesh"""
+        return self._level
+
+    def error(self):
+        """Returns how far the part strays from the full mesh"""
+        return self._error
+
+    def isCompatible(self, mesh):
+        """Returns whether updateMesh can show a mesh in the buffers of the part
+
+        It needs the same vertex count, indices and attributes, and positions
+        within the bounds the buffer is quantized to, unless stored as floats."""
+        same = (len(mesh['vertices']) == len(self._vertices) and
+                all((mesh[name] is None) == (getattr(self, '_' + name) is None)
+                    for name in ('normals', 'texcoords', 'colors', 'indices')))
+        if not same or (mesh['indices'] is not None and
+                        not np.array_equal(mesh['indices'], self._indices)):
+            return False
+        if self._vertex_format == Actor.VertexFormat.Float or self._quantized_bounds is None:
+            return True
+        low, high = self._quantized_bounds
+        # the box went through float32, allow for its rounding
+        tolerance = 1e-6 * (high - low)
+        return bool(np.all(mesh['vertices'].min(axis=0) >= low - tolerance) and
+                    np.all(mesh['vertices'].max(axis=0) <= high + tolerance))
+
+    def updateMesh(self, mesh, material):
+        """Shows a compatible mesh, rewriting the attributes that changed
+
+        Returns whether the material or any attribute changed."""
+        changed = {name: mesh[name] for name in ('vertices', 'normals', 'colors', 'texcoords')
+                   if mesh[name] is not None and not np.array_equal(mesh[name], getattr(self, '_' + name))}
+        if changed:
+            self.updateBuffer(**changed)
+            for name, values in changed.items():
+                setattr(self, '_' + name, values)
+        self._error = mesh['error']
+        if material is not self._material:
+            self._material = self._active_material = material
+            return True
+        return bool(changed)
+
     def isSelectable(self):
         """Returns true if actor is selectable"""
         return True
@@ -31,10 +116,69 @@ class WFOParts(Actor):
         if self._vertices is None:
             self.generateGeometry()
 
-        # create object
-        self.create(vertices=self._vertices, normals=self._normals,
-                    texcoords=self._texcoords)
+        # create object, unless its buffers already exist
+        if self._source is not None:
+            self.share(self._source)
+        else:
+            self.create(vertices=self._vertices, normals=self._normals, colors=self._colors,
+                        texcoords=self._texcoords, indices=self._indices)
 
     def render(self):
         """Render object"""
-        GL.glDrawArrays(self._render_mode, 0, len(self._vertices))
+        if self._indices is not None:
+            GL.glDrawElements(self._render_mode,
+                              self.numberOfIndices, self.indexType, None)
+        else:
+            GL.glDrawArrays(self._render_mode, 0, len(self._vertices))
+
+    def bindInstanceBuffer(self, buffer):
+        """Feeds the per-instance attributes of the instanced shaders from buffer
+
+        The attributes become part of the bound vertex array state. Parts are
+        shared by several levels, each with its own buffer, so this is done
+        before every instanced draw."""
+        itemsize = np.dtype(np.float32).itemsize
+        stride = INSTANCE_FLOATS * itemsize
+        # model matrix columns, normal matrix columns and flags
+        layout = [(4 + column, 4, 4 * column) for column in range(4)] + \
+                 [(8 + column, 3, 16 + 3 * column) for column in range(3)] + [(11, 2, 25)]
+        buffer.bind()
+        for location, size, offset in layout:
+            GL.glEnableVertexAttribArray(location)
+            GL.glVertexAttribPointer(location, size, GL.GL_FLOAT, GL.GL_FALSE,
+                                     stride, ctypes.c_void_p(offset * itemsize))
+            GL.glVertexAttribDivisor(location, 1)
+        buffer.release()
+
+    def renderInstanced(self, count, shading, buffer):
+        """Render count copies of the part, placed by the instance buffer"""
+        if shading == GL.GL_SMOOTH:
+            self._active_shader = self._instanced_shader
+        else:
+            self._active_shader = self._instanced_flat_shader
+        self._active_material = self._material
+
+        GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+        GL.glEnable(GL.GL_DEPTH_TEST)
+        GL.glDepthMask(GL.GL_TRUE)
+
+        self._active_shader.bind()
+        self.setUniformBindings()
+        # highlight comes with every instance
+        self._active_shader.setUniformValue(
+            "material.emission", self._active_material.emissionColor)
+
+        if self._texture is not None:
+            self._texture.bind()
+
+        self._vao.bind()
+        self.bindInstanceBuffer(buffer)
+        if self._indices is not None:
+            GL.glDrawElementsInstanced(self._render_mode,
+                                       self.numberOfIndices, self.indexType, None, count)
+        else:
+            GL.glDrawArraysInstanced(self._render_mode, 0, len(self._vertices), count)
+        self._vao.release()
+        if self._texture is not None:
+            self._texture.release()
+        self._active_shader.release()
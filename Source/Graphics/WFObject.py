@@ -1,8 +1,16 @@
+import os
 import numpy as np
 from PyQt5.QtGui import *
 from OpenGL import GL
 from Source.Graphics.Group import Group
+from Source.Graphics.Actor import Actor, transform_bounds, transform_sphere
 from parser import Parser
+from meshcache import MeshCache
+from Source.Graphics.Materials import Materials
+from Source.Graphics.Geometries import Geometries
+from Source.Graphics.WFOParts import WFOParts
+from Source.Graphics.Textures import Textures
+from wavefront import texture_path
 
 
 class WFObject(Group):
@@ -12,30 +20,243 @@ class WFObject(Group):
         self._transform = kwargs.get("transform", QMatrix4x4())
         self._name = kwargs.get("name", "Actor"+str(id(self)))
         self.setSelectable(True)
+        self._highlighted = False
 
-        filename = kwargs.get('filename')
-        parts = Parser(filename, self.scene).get_WFOParts()
-        for part in parts:
-            self.addPart(part)
+        self._filename = kwargs.get('filename')
+        self._cache = kwargs.get('cache', MeshCache())
+        self._vertex_format = kwargs.get('vertex_format', Actor.VertexFormat.Float)
+        self._vertex_layout = kwargs.get('vertex_layout', Actor.VertexLayout.Planar)
+        # keyword arguments of the Parser reading the file, see ObjectLoader
+        self._parser_options = kwargs.get('parser_options', {})
+        parser = Parser(self._filename, meshes=kwargs.get('meshes'), cache=self._cache,
+                        profile=kwargs.get('profile'), **self._parser_options)
+
+        # copies of a loaded file draw the buffers of the first one, if they
+        # are stored in the same vertex format and layout
+        key = parser.geometry_key() + (self._vertex_format, self._vertex_layout)
+        geometry = Geometries().acquire(key, self)
+        owned = geometry is None
+        if owned:
+            geometry = self._addGeometry(
+                key, parser, self._createParts(parser, vertex_format=self._vertex_format,
+                                               vertex_layout=self._vertex_layout))
+        self._level = 0
+        self._setGeometry(geometry, parser, owned)
 
         self.setTransform(self._transform)
 
+    def filename(self):
+        """Returns the file the object was loaded from"""
+        return self._filename
+
+    def reload(self, meshes=None, profile=None):
+        """Shows the file again after it changed, keeping the transform, selection and level
+
+        Parts are matched to the new meshes by material, texture and level,
+        then by texture and level alone, as edited materials merge into
+        other meshes. Parts whose meshes are unchanged are kept as they are,
+        and parts whose meshes keep their vertex count and indices only have
+        their material and the attributes that changed replaced, with
+        updateBuffer. Only the other parts are uploaded again. Returns the
+        number of parts kept, updated and uploaded."""
+        parser = Parser(self._filename, meshes=meshes, cache=self._cache, profile=profile,
+                        **self._parser_options)
+        key = parser.geometry_key() + (self._vertex_format, self._vertex_layout)
+        geometry = Geometries().acquire(key, self)
+        if geometry is self._geometry:
+            return (len(self._all_parts), 0, 0)
+        owned = geometry is None
+        counts = [0, 0, 0]
+        if owned:
+            # the object reloaded first updates the parts every copy draws
+            meshes = [(mesh,) + self._meshMaterial(mesh) for mesh in parser.iter_counted_meshes()]
+            matches = [None] * len(meshes)
+            free = list(self._all_parts)
+            for exact in (True, False):
+                for index, (mesh, material, texture) in enumerate(meshes):
+                    part = next((part for part in free if part.texture() is texture and
+                                 part.level() == mesh['level'] and
+                                 (part.material is material or not exact)), None)
+                    if matches[index] is None and part is not None:
+                        matches[index] = part
+                        free.remove(part)
+            parts = []
+            for (mesh, material, texture), part in zip(meshes, matches):
+                if part is not None and part.isCompatible(mesh):
+                    counts[1 if part.updateMesh(mesh, material) else 0] += 1
+                else:
+                    with parser.profile.stage('upload'):
+                        part = self._createPart(mesh, material, texture, vertex_format=self._vertex_format,
+                                                vertex_layout=self._vertex_layout)
+                    counts[2] += 1
+                parts.append(part)
+            geometry = self._addGeometry(key, parser, parts)
+        self._geometry.users.discard(self)
+        self._setGeometry(geometry, parser, owned)
+        self.setHighlighted(self._highlighted)
+        self.setTransform(self._transform)
+        return tuple(counts)
+
+    def _addGeometry(self, key, parser, parts):
+        """Registers the parts read by parser as the geometry of key, used by this object"""
+        levels = self._levelParts(parts)
+        return Geometries().add(
+            key, self, levels[0], (parser.soup_bytes, parser.indexed_bytes),
+            [(parts, max(part.error() for part in parts)) for parts in levels[1:]],
+            parser.acmr(), parser.removed)
+
+    def _setGeometry(self, geometry, parser, owned):
+        """Shows a geometry, through copies of its parts unless it was built by this object"""
+        levels = [level.parts for level in geometry.levels]
+        if not owned:
+            copies = {}
+            with parser.profile.stage('share'):
+                for level in geometry.levels:
+                    for each in level.parts:
+                        if each not in copies:
+                            copies[each] = WFOParts(self.scene, source=each)
+            levels = [[copies[each] for each in parts] for parts in levels]
+        self._geometry = geometry
+        self._levels = levels
+        self._level = min(self._level, len(self._levels) - 1)
+        self._all_parts = list(dict.fromkeys(part for parts in self._levels for part in parts))
+        self._parts.clear()
+        for part in self._levels[self._level]:
+            self.addPart(part)
+        self._byte_counts = geometry.byte_counts
+        self._report = parser.report()
+
+    def _createParts(self, parser, **kwargs):
+        """Returns a part for every mesh read by parser, created with the given actor options"""
+        parts = []
+        for mesh in parser.iter_counted_meshes():
+            with parser.profile.stage('upload'):
+                parts.append(self._createPart(mesh, *self._meshMaterial(mesh), **kwargs))
+        return parts
+
+    def _createPart(self, mesh, material, texture, **kwargs):
+        """Returns a part uploading a mesh, created with the given actor options"""
+        return WFOParts(self.scene, vertices=mesh['vertices'], normals=mesh['normals'],
+                        texcoords=mesh['texcoords'], colors=mesh['colors'],
+                        indices=mesh['indices'], material=material, texture=texture,
+                        level=mesh['level'], error=mesh['error'], **kwargs)
+
+    def _meshMaterial(self, mesh):
+        """Returns the shared material and texture of a mesh, or None for the texture
+
+        Images of textured parts are decoded in the background and drawn
+        once they are ready."""
+        material = Materials().material(*(mesh['material'][name] for name in (
+            'emission', 'ambient', 'diffuse', 'specular', 'shininess')))
+        texture = None
+        path = texture_path(os.path.dirname(os.path.abspath(self._filename)),
+                            mesh['material'].get('texture'))
+        if path is not None and mesh['texcoords'] is not None:
+            texture = Textures().texture(path)
+        return material, texture
+
+    def _levelParts(self, parts):
+        """Returns the list of parts of every detail level
+
+        Parts come as each full mesh followed by its own levels, a mesh with
+        fewer levels than others takes part in the deeper ones with its last
+        level. Parts sharing a material are drawn one after the other."""
+        chains = []
+        for part in parts:
+            if part.level() == 0:
+                chains.append([])
+            chains[-1].append(part)
+        chains.sort(key=lambda chain: Materials().index(chain[0].material))
+        depth = max(len(chain) for chain in chains) if chains else 1
+        return [[chain[min(level, len(chain) - 1)] for chain in chains] for level in range(depth)]
+
+    def level(self):
+        """Returns the detail level being drawn"""
+        return self._level
+
+    def setLevel(self, level):
+        """Draws the parts of a detail level, 0 being the full meshes"""
+        level = min(level, len(self._levels) - 1)
+        if level != self._level:
+            self._parts.clear()
+            for part in self._levels[level]:
+                self.addPart(part)
+            self._level = level
+
+    def levelErrors(self):
+        """Returns the error of every detail level, in world units"""
+        return self._level_errors
+
+    def bounds(self):
+        """Returns the x, y, z center and the radius of a sphere around the object, in world units"""
+        return self._bounds
+
+    def localBounds(self):
+        """Returns the corners of the box around the full geometry, in object units"""
+        return self._geometry.bounds()
+
+    def boundingSphere(self):
+        """Returns the center and radius of a sphere around the full geometry, in object units"""
+        return self._geometry.sphere()
+
+    def worldBounds(self):
+        """Returns the corners of the axis aligned box around the object, in world units"""
+        return self._world_bounds
+
+    def worldSphere(self):
+        """Returns the center and radius of a sphere around the object, in world units"""
+        return self._world_sphere
+
+    def _updateBounds(self):
+        """Places the bounding volumes and level errors of the geometry with the transform"""
+        self._world_bounds = transform_bounds(self._transform, *self._geometry.bounds())
+        self._world_sphere = transform_sphere(self._transform, *self._geometry.sphere())
+        center, radius = self._world_sphere
+        scale = max(self._transform.column(k).toVector3D().length() for k in range(3))
+        self._bounds = (float(center[0]), float(center[1]), float(center[2]), radius)
+        self._level_errors = tuple(level.error * scale for level in self._geometry.levels)
+        if self.scene is not None:
+            self.scene.invalidateLevels()
+
+    def geometry(self):
+        """Returns the geometry of the level drawn, shared with other objects loaded from the same file"""
+        return self._geometry.levels[self._level]
+
+    def byteCounts(self):
+        """Returns the vertex data size before and after welding"""
+        return self._byte_counts
+
+    def report(self):
+        """Returns the time and memory spent in every stage of the load, see Profile.report"""
+        return self._report
+
+    def acmr(self):
+        """Returns the average cache miss ratio of the parts before and after reordering, or None"""
+        return self._geometry.acmr
+
+    def removed(self):
+        """Returns the counts of degenerate and duplicate triangles and unused vertices dropped, or None"""
+        return self._geometry.removed
+
     def setHighlighted(self, value):
-        for part in self.parts:
+        self._highlighted = value
+        for part in self._all_parts:
             part.setHighlighted(value)
+        self._invalidate()
 
-    def intersect(self, ray):
-        results, distances = [], []
-        for part in self.parts:
-            result, distance = part.intersect(ray)
-            results.append(result)
-            distances.append(distance)
-        return max(results), min(distances)
+    def isHighlighted(self):
+        return self._highlighted
+
+    def setSelected(self, value):
+        super(WFObject, self).setSelected(value)
+        self._invalidate()
 
     def setTransform(self, xform):
         self._transform = xform
-        for part in self.parts:
+        for part in self._all_parts:
             part.setTransform(xform)
+        self._updateBounds()
+        self._invalidate()
 
     def transform(self):
         return self._transform
@@ -47,5 +268,12 @@ class WFObject(Group):
     def setPosition(self, pos):
         self._transform = QMatrix4x4()
         self._transform.translate(pos.x(), pos.y(), pos.z())
-        for part in self.parts:
+        for part in self._all_parts:
             part.setPosition(pos)
+        self._updateBounds()
+        self._invalidate()
+
+    def _invalidate(self):
+        """Tells every level that the instance data of this object changed"""
+        for level in self._geometry.levels:
+            level.invalidate(self)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from parser import precompile
+from meshcache import MeshCache
+from wavefront import is_obj
+
+# Processes Wavefront files ahead of time, so the viewer only maps the
+# results. Neither Qt nor OpenGL is imported. Entries are only found by a
+# viewer loading with the same parameters, which are the defaults unless
+# changed here.
+
+
+def find_objects(paths):
+    """Returns the Wavefront files given or found under the directories given"""
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, names in os.walk(path):
+                dirnames.sort()
+                filenames.extend(os.path.join(dirpath, name)
+                                 for name in sorted(names) if is_obj(name))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description="precompile Wavefront files into the binary mesh cache")
+    parser.add_argument("paths", nargs='+',
+                        help="OBJ files, plain or compressed, or directories to walk")
+    parser.add_argument("--cache", help="cache directory, the viewer's by default")
+    parser.add_argument("--max-mb", type=int, default=None,
+                        help="size limit of the cache directory, in MiB")
+    parser.add_argument("--bundle", help="also pack every entry in a single bundle file, "
+                        "used once placed in the cache directory of the viewer")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes")
+    parser.add_argument("--lod-levels", type=int, default=3, help="simplified levels per mesh")
+    parser.add_argument("--lod-ratio", type=float, default=0.5,
+                        help="triangles kept by every level from the previous one")
+    parser.add_argument("--crease-angle", type=float, default=None,
+                        help="smooth made up normals up to this angle, in degrees")
+    parser.add_argument("--no-optimize", action='store_true',
+                        help="keep the triangle order of the files")
+    parser.add_argument("--no-cleanup", action='store_true',
+                        help="keep degenerate and duplicate triangles and unused vertices")
+    parser.add_argument("--overdraw", action='store_true',
+                        help="also sort triangle clusters against overdraw")
+    parser.add_argument("--stream", action='store_true',
+                        help="keep objects apart instead of merging materials, "
+                        "for a viewer run with --stream")
+
+    args = parser.parse_args()
+
+    filenames = find_objects(args.paths)
+    if not filenames:
+        print("No Wavefront files found")
+        return 1
+
+    # a bundle alone is packed from a scratch cache that may grow as needed
+    scratch = None
+    if args.cache is None and args.bundle is not None:
+        scratch = tempfile.mkdtemp()
+        cache = MeshCache(scratch, max_bytes=float('inf'))
+    else:
+        cache = MeshCache(args.cache)
+        if args.max_mb is not None:
+            cache.max_bytes = args.max_mb * 1024 * 1024
+        elif args.bundle is not None:
+            # entries must outlive the packing of the bundle
+            cache.max_bytes = float('inf')
+
+    options = {'lod_levels': args.lod_levels, 'lod_ratio': args.lod_ratio,
+               'crease_angle': args.crease_angle, 'optimize': not args.no_optimize,
+               'overdraw': args.overdraw, 'cleanup': not args.no_cleanup,
+               'merge': not args.stream}
+    keys, failures, triangles = {}, 0, 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(precompile, filename, cache, **options): filename
+                       for filename in filenames}
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    key, count, elapsed = future.result()
+                except Exception as error:
+                    failures += 1
+                    print("{}: {}".format(filename, error))
+                else:
+                    keys[filename] = key
+                    triangles += count
+                    print("{}: {} triangles in {:.2f} s".format(filename, count, elapsed))
+        print("Precompiled {} files, {} triangles, in {:.2f} s".format(
+            len(keys), triangles, time.perf_counter() - start))
+
+        if args.bundle is not None:
+            count = cache.bundle(args.bundle, [keys[filename] for filename in sorted(keys)])
+            print("Packed {} entries into {}".format(count, args.bundle))
+    finally:
+        if scratch is not None:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -6,6 +6,8 @@ import argparse
 from OpenGL import GL
 from PyQt5 import Qt, QtCore
 from Source.GUI.MainWindow import MainWindow
+from Source.Graphics.Actor import Actor
+from wavefront import CHUNK_SIZE
 
 def main():
 
@@ -13,6 +15,21 @@ def main():
     parser.add_argument("--glversion", help="use specific OpenGL version")
     parser.add_argument(
         "--glsamples", help="use specific number of samples for rendering")
+    parser.add_argument(
+        "--hot-reload", action="store_true", help="reload objects when their files are edited")
+    parser.add_argument(
+        "--interleaved", action="store_true", help="store the attributes of every vertex together")
+    parser.add_argument(
+        "--vertex-format", choices=["float", "half", "normalized"], default="float",
+        help="type of the positions, normals and texture coordinates on the GPU")
+    parser.add_argument(
+        "--import-report", action="store_true", help="print sizes, timings and cleanup counts of every load")
+    parser.add_argument(
+        "--stream", action="store_true",
+        help="upload every object as it is read instead of merging materials, bounding memory by --chunk-size")
+    parser.add_argument(
+        "--chunk-size", type=int, default=CHUNK_SIZE // (1024 * 1024),
+        help="MiB of text read at a time from a file")
 
     args = parser.parse_args()
 
@@ -55,7 +72,14 @@ def main():
     app = Qt.QApplication(sys.argv)
 
     # create main window and show
-    mainWindow = MainWindow()
+    layout = Actor.VertexLayout.Interleaved if args.interleaved else Actor.VertexLayout.Planar
+    vertex_format = {'float': Actor.VertexFormat.Float, 'half': Actor.VertexFormat.Half,
+                     'normalized': Actor.VertexFormat.Normalized}[args.vertex_format]
+    parser_options = {'merge': not args.stream, 'chunk_size': args.chunk_size * 1024 * 1024}
+    mainWindow = MainWindow(options={'hot_reload': args.hot_reload, 'vertex_layout': layout,
+                                     'vertex_format': vertex_format,
+                                     'import_report': args.import_report,
+                                     'parser_options': parser_options})
     mainWindow.show()
 
     # run...
@@ -0,0 +1,675 @@
+import numpy as np
+from collections import OrderedDict, deque
+
+
+def weld(vertices, normals, texcoords):
+    """Merges identical (position, normal, texcoord) vertices of a triangle soup
+
+    Returns the unique vertices, normals and texcoords, in order of first
+    appearance, and the index array that rebuilds the soup from them. Indices
+    are uint16 whenever the unique vertices fit, uint32 otherwise."""
+    attributes = [np.ascontiguousarray(each, dtype=np.float32)
+                  for each in (vertices, normals, texcoords) if each is not None]
+    if len(vertices) == 0:
+        return vertices, normals, texcoords, np.zeros(0, dtype=np.uint16)
+    rows = np.hstack([each.reshape(len(vertices), -1) for each in attributes])
+    # -0.0 and 0.0 are the same value but not the same bytes
+    rows += 0.0
+    keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1])))
+    _, first, inverse = np.unique(keys.ravel(), return_index=True,
+                                  return_inverse=True)
+
+    # renumber unique vertices by first appearance to keep the file order
+    order = np.argsort(first)
+    remap = np.empty_like(order)
+    remap[order] = np.arange(len(order))
+    unique = first[order]
+
+    dtype = np.uint16 if len(unique) <= 65536 else np.uint32
+    indices = remap[inverse.ravel()].astype(dtype)
+    return (vertices[unique],
+            None if normals is None else normals[unique],
+            None if texcoords is None else texcoords[unique],
+            indices)
+
+
+def nbytes(*arrays):
+    """Returns the total size in bytes of the given arrays"""
+    return sum(each.nbytes for each in arrays if each is not None)
+
+
+def quantize_positions(vertices, dtype=np.int16, scale=None, offset=None):
+    """Returns positions relative to their bounding box, with the scale and offset restoring them
+
+    Positions span [-1, 1] over the box, as float16 or as int16 meant to be
+    read normalized, and are padded to four components so every vertex
+    stays 4 byte aligned. Given a scale and offset, positions are placed in
+    that box instead, clamped to it."""
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if scale is None:
+        if len(vertices) == 0:
+            low = high = np.zeros(3, dtype=np.float32)
+        else:
+            low, high = vertices.min(axis=0), vertices.max(axis=0)
+        offset = (low + high) / 2.0
+        scale = (high - low) / 2.0
+        scale[scale == 0.0] = 1.0
+    local = np.clip((vertices - offset) / scale, -1.0, 1.0)
+    packed = np.zeros((len(vertices), 4), dtype=dtype)
+    if np.issubdtype(dtype, np.integer):
+        packed[:, :3] = np.round(local * np.iinfo(dtype).max)
+    else:
+        packed[:, :3] = local
+    return packed, np.asarray(scale, dtype=np.float32), np.asarray(offset, dtype=np.float32)
+
+
+def pack_normals(normals):
+    """Returns normals packed as the signed 10 bit fields of GL_INT_2_10_10_10_REV
+
+    Normals are made unit length first, shaders only use their direction."""
+    normals = _unit(np.asarray(normals, dtype=np.float32).reshape(-1, 3))
+    fields = np.round(np.clip(normals, -1.0, 1.0) * 511).astype(np.int32) & 0x3FF
+    return (fields[:, 0] | (fields[:, 1] << 10) | (fields[:, 2] << 20)).astype(np.uint32)
+
+
+def interleave(vertices, normals=None, colors=None, texcoords=None):
+    """Returns the attributes of every vertex side by side, as one structured array
+
+    Fields are named after the shader attributes, in the order given and
+    with the types given, so the byte offset of every field and the item
+    size are the offsets and stride of the attributes in a vertex buffer."""
+    attributes = [(name, np.asarray(values)) for name, values in (
+        ('position', vertices), ('normal', normals), ('color', colors), ('texcoord', texcoords))
+        if values is not None]
+    count = len(attributes[0][1])
+    data = np.empty(count, dtype=[(name, values.dtype, values.shape[1:]) for name, values in attributes])
+    for name, values in attributes:
+        data[name] = values
+    return data
+
+
+def face_normals(vertices):
+    """Returns the unit normal of every triangle of a soup, once per corner
+
+    Normals follow the winding of the triangles and are zero for
+    degenerate ones."""
+    triangles = np.asarray(vertices, dtype=np.float32).reshape(-1, 3, 3)
+    normals = _unit(np.cross(triangles[:, 2] - triangles[:, 1],
+                             triangles[:, 0] - triangles[:, 1]))
+    return np.repeat(normals, 3, axis=0)
+
+
+def smooth_normals(vertices, crease_angle=180.0, block=1 << 22):
+    """Returns angle weighted vertex normals of a triangle soup, once per corner
+
+    The normal of a corner averages the normals of the triangles sharing its
+    position, each weighted by the angle of the triangle at that position.
+    Triangles whose normal differs by more than crease_angle degrees from
+    the corner's own triangle are left out, keeping hard edges sharp. Pairs
+    of corners are compared block corners at a time."""
+    triangles = np.asarray(vertices, dtype=np.float32).reshape(-1, 3, 3)
+    normals = np.repeat(_unit(np.cross(triangles[:, 2] - triangles[:, 1],
+                                       triangles[:, 0] - triangles[:, 1])), 3, axis=0)
+    weighted = normals * _corner_angles(triangles).reshape(-1, 1)
+    rows = np.ascontiguousarray(triangles.reshape(-1, 3)) + 0.0
+    keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * 3))).ravel()
+    _, ids = np.unique(keys, return_inverse=True)
+    ids = ids.ravel()
+
+    if crease_angle >= 180.0:
+        # no creases, one normal per position
+        sums = np.stack([np.bincount(ids, weighted[:, k]) for k in range(3)], axis=1)
+        return _unit(sums[ids])
+
+    # compare every corner with all corners sharing its position
+    order = np.argsort(ids, kind='stable')
+    counts = np.bincount(ids)
+    starts = np.cumsum(counts) - counts
+    group = ids[order]
+    pairs = counts[group]
+    ends = np.cumsum(pairs)
+    threshold = np.cos(np.radians(crease_angle))
+    sums = np.zeros((len(order), 3), dtype=np.float64)
+    first = 0
+    while first < len(order):
+        last = max(first + 1, int(np.searchsorted(ends, ends[first] - pairs[first] + block, side='right')))
+        size = pairs[first:last]
+        corner = np.repeat(np.arange(first, last), size)
+        partner = np.repeat(starts[group[first:last]] - np.cumsum(size) + size, size) + \
+            np.arange(size.sum())
+        corner, partner = order[corner], order[partner]
+        keep = np.einsum('ij,ij->i', normals[corner], normals[partner]) >= threshold
+        for k in range(3):
+            sums[:, k] += np.bincount(corner[keep], weighted[partner[keep], k],
+                                      minlength=len(order))
+        first = last
+    return _unit(sums)
+
+
+def project_texcoords(vertices, mapping='box'):
+    """Returns texture coordinates of a triangle soup projected over its bounding box
+
+    planar projects every vertex along the thinnest axis of the box, box
+    projects each triangle along the axis closest to its normal and
+    spherical wraps longitude and latitude around the center of the box.
+    Coordinates span [0, 1] over the largest extent of the box."""
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if len(vertices) == 0:
+        return np.zeros((0, 2), dtype=np.float32)
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    extent = high - low
+    local = (vertices - low) / (extent.max() or 1.0)
+    if mapping == 'planar':
+        texcoords = np.delete(local, int(np.argmin(extent)), axis=1)
+    elif mapping == 'box':
+        axis = np.argmax(np.abs(face_normals(vertices)), axis=1)
+        others = np.array([[1, 2], [0, 2], [0, 1]])[axis]
+        texcoords = np.take_along_axis(local, others, axis=1)
+    elif mapping == 'spherical':
+        offsets = vertices - (low + high) / 2.0
+        radius = np.linalg.norm(offsets, axis=1)
+        radius[radius == 0.0] = 1.0
+        texcoords = np.stack(
+            (0.5 + np.arctan2(offsets[:, 2], offsets[:, 0]) / (2.0 * np.pi),
+             0.5 + np.arcsin(np.clip(offsets[:, 1] / radius, -1.0, 1.0)) / np.pi), axis=1)
+    else:
+        raise ValueError("Unknown texture mapping {}".format(mapping))
+    return texcoords.astype(np.float32)
+
+
+def _corner_angles(triangles):
+    """Returns the interior angles of (n, 3, 3) triangles at each corner"""
+    angles = np.empty(triangles.shape[:2], dtype=np.float32)
+    for k in range(3):
+        a = triangles[:, (k + 1) % 3] - triangles[:, k]
+        b = triangles[:, (k + 2) % 3] - triangles[:, k]
+        angles[:, k] = np.arctan2(np.linalg.norm(np.cross(a, b), axis=1),
+                                  np.einsum('ij,ij->i', a, b))
+    return angles
+
+
+def _unit(vectors):
+    """Returns vectors scaled to unit length, leaving zero vectors alone"""
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(lengths > 0.0, lengths, 1.0)).astype(np.float32)
+
+
+def merge(meshes, colors=False):
+    """Concatenates the meshes sharing a material into a single mesh
+
+    Meshes are the dictionaries built by the Parser. Merged meshes keep the
+    order in which their materials first appear and their indices are
+    offset into the concatenated vertices, widened to uint32 when needed.
+    With colors, untextured meshes whose materials only differ in diffuse
+    color are further merged into one mesh carrying the diffuse color of
+    every vertex."""
+    groups = OrderedDict()
+    for mesh in meshes:
+        key = (_material_key(mesh['material']),
+               mesh['texcoords'] is None, mesh['indices'] is None)
+        groups.setdefault(key, []).append(mesh)
+
+    merged = []
+    for group in groups.values():
+        mesh = dict(group[0])
+        if len(group) > 1:
+            for name in ('vertices', 'normals', 'texcoords'):
+                if mesh[name] is not None:
+                    mesh[name] = np.concatenate([each[name] for each in group])
+            if mesh['indices'] is not None:
+                mesh['indices'] = _concatenate_indices(group)
+        merged.append(mesh)
+
+    if colors and len(merged) > 1 and _diffuse_only(merged):
+        mesh = dict(merged[0])
+        for name in ('vertices', 'normals'):
+            mesh[name] = np.concatenate([each[name] for each in merged])
+        mesh['colors'] = np.repeat(
+            np.array([each['material']['diffuse'] for each in merged], dtype=np.float32),
+            [len(each['vertices']) for each in merged], axis=0)
+        if mesh['indices'] is not None:
+            mesh['indices'] = _concatenate_indices(merged)
+        merged = [mesh]
+    return merged
+
+
+def _concatenate_indices(meshes):
+    """Returns the indices of meshes offset into their concatenated vertices"""
+    counts = [len(each['vertices']) for each in meshes]
+    dtype = np.uint16 if sum(counts) <= 65536 else np.uint32
+    offsets = np.cumsum([0] + counts[:-1])
+    return np.concatenate([each['indices'].astype(dtype) + dtype(offset)
+                           for each, offset in zip(meshes, offsets)])
+
+
+def _diffuse_only(meshes):
+    """Returns whether untextured meshes only differ in diffuse color"""
+    first = meshes[0]
+    if any(each['texcoords'] is not None or each.get('colors') is not None or
+           (each['indices'] is None) != (first['indices'] is None) for each in meshes):
+        return False
+    keys = set(_material_key(dict(each['material'], diffuse=None)) for each in meshes)
+    return len(keys) == 1
+
+
+def _material_key(material):
+    """Returns a hashable version of material parameters"""
+    return tuple((name, tuple(value) if isinstance(value, (list, tuple)) else value)
+                 for name, value in sorted(material.items()))
+
+
+def cleanup(meshes, tolerance=1e-6):
+    """Yields meshes without degenerate or duplicate triangles nor unused vertices
+
+    See clean, every mesh gets the 'removed' counts of what went away."""
+    for mesh in meshes:
+        yield clean(mesh, tolerance)
+
+
+def clean(mesh, tolerance=1e-6):
+    """Returns a mesh without degenerate or duplicate triangles nor unused vertices
+
+    Triangles are degenerate when they repeat a corner or the sine of the
+    angle at their first corner is at most tolerance, i.e. their area is
+    nothing next to their edges. Duplicates repeat the corners of an earlier
+    triangle in the same winding, so faces seen from both sides stay. The
+    'removed' counts of degenerate and duplicate triangles and of
+    unreferenced vertices are added to the mesh, vertices keep their order."""
+    indices = mesh['indices']
+    if indices is None:
+        # triangle soup, corners are told apart by all of their attributes
+        rows = np.hstack([mesh[name].reshape(len(mesh['vertices']), -1).astype(np.float32)
+                          for name in ('vertices', 'normals', 'texcoords', 'colors')
+                          if mesh.get(name) is not None]) + 0.0
+        keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1])))
+        faces = np.unique(keys.ravel(), return_inverse=True)[1].reshape(-1, 3)
+    else:
+        faces = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+
+    corners = np.asarray(mesh['vertices'], dtype=np.float64).reshape(-1, 3)
+    corners = corners.reshape(-1, 3, 3) if indices is None else corners[faces]
+    first, second = corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]
+    degenerate = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | \
+                 (faces[:, 0] == faces[:, 2]) | \
+                 (np.linalg.norm(np.cross(first, second), axis=1) <=
+                  tolerance * np.linalg.norm(first, axis=1) * np.linalg.norm(second, axis=1))
+
+    # the same triangle starts at its lowest corner whatever corner it was written from
+    start = np.argmin(faces, axis=1)
+    rotated = faces[np.arange(len(faces))[:, None], (start[:, None] + np.arange(3)) % 3]
+    keep = np.zeros(len(faces), dtype=bool)
+    valid = np.flatnonzero(~degenerate)
+    keep[valid[np.unique(rotated[valid], axis=0, return_index=True)[1]]] = True
+
+    cleaned = dict(mesh)
+    removed = {'degenerate': int(degenerate.sum()),
+               'duplicate': int(len(valid) - keep.sum()), 'unreferenced': 0}
+    if indices is None:
+        rows = np.repeat(keep, 3)
+        for name in ('vertices', 'normals', 'texcoords', 'colors'):
+            if mesh.get(name) is not None:
+                cleaned[name] = mesh[name][rows]
+    else:
+        used, inverse = np.unique(faces[keep].ravel(), return_inverse=True)
+        removed['unreferenced'] = len(mesh['vertices']) - len(used)
+        for name in ('vertices', 'normals', 'texcoords', 'colors'):
+            if mesh.get(name) is not None:
+                cleaned[name] = mesh[name][used]
+        dtype = np.uint16 if len(used) <= 65536 else np.uint32
+        cleaned['indices'] = inverse.ravel().astype(dtype)
+    cleaned['removed'] = removed
+    return cleaned
+
+
+def lod_chain(meshes, levels=3, ratio=0.5, min_triangles=64):
+    """Yields every mesh followed by its simplified levels
+
+    Level k keeps about ratio ** k of the triangles of the mesh and carries
+    its 'level' and the geometric 'error' of the simplification, in mesh
+    units. Meshes stop getting levels once they fall below min_triangles."""
+    for mesh in meshes:
+        yield mesh
+        if levels > 0:
+            for level, simplified in enumerate(decimate(
+                    mesh, [ratio ** (k + 1) for k in range(levels)], min_triangles), 1):
+                simplified['level'] = level
+                yield simplified
+
+
+def decimate(mesh, ratios, min_triangles=64):
+    """Returns simplified copies of a mesh, keeping about each ratio of its triangles
+
+    Edges are collapsed by quadric error, in rounds that collapse the
+    cheapest edge of many vertices at once, no two of them sharing a vertex.
+    Vertices are collapsed by position, so seams between normals, texcoords
+    or colors stay closed, and open borders are held in place by planes
+    perpendicular to them. Copies that would not lose a tenth of the
+    triangles of the previous one are left out."""
+    vertices = np.asarray(mesh['vertices'], dtype=np.float32).reshape(-1, 3)
+    indices = mesh['indices']
+    corners = np.arange(len(vertices)) if indices is None else indices.astype(np.int64)
+    corners = corners.reshape(-1, 3)
+    if len(corners) < min_triangles:
+        return []
+
+    rows = np.ascontiguousarray(vertices) + 0.0
+    keys = rows.view(np.dtype((np.void, rows.dtype.itemsize * 3))).ravel()
+    _, first, ids = np.unique(keys, return_index=True, return_inverse=True)
+    ids = ids.ravel()
+    positions = vertices[first].astype(np.float64)
+    faces = ids[corners]
+    quadrics = _quadrics(positions, faces)
+
+    # parent of every position after collapses and faces still standing
+    parent = np.arange(len(positions))
+    alive = np.arange(len(faces))
+    error, previous, simplified = 0.0, len(faces), []
+    for ratio in ratios:
+        target = max(int(len(corners) * ratio), 1)
+        while len(faces) > target:
+            collapsed = _collapse(positions, quadrics, faces, (len(faces) - target + 1) // 2)
+            if collapsed is None:
+                break
+            remap, cost = collapsed
+            faces = remap[faces]
+            standing = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & \
+                (faces[:, 2] != faces[:, 0])
+            faces, alive = faces[standing], alive[standing]
+            parent = remap[parent]
+            error = max(error, float(np.sqrt(max(cost, 0.0))))
+        if len(faces) > 0.9 * previous or len(faces) < min_triangles // 4:
+            break
+        previous = len(faces)
+        simplified.append(_simplified(mesh, corners[alive], positions, parent[ids], error))
+    return simplified
+
+
+def _quadrics(positions, faces, border_weight=1.0):
+    """Returns the error quadric of every position, as a (n, 4, 4) array
+
+    Planes have unit normals, so the error of a point is the sum of its
+    squared distances to the planes of the triangles around it."""
+    a, b, c = (positions[faces[:, k]] for k in range(3))
+    normals = np.cross(b - a, c - a)
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = normals / np.where(lengths > 0.0, lengths, 1.0)
+    planes = np.hstack([normals, -np.einsum('ij,ij->i', normals, a)[:, None]])
+    products = (planes[:, :, None] * planes[:, None, :]).reshape(-1, 16)
+    points = faces.ravel()
+    weights = np.repeat(products, 3, axis=0)
+
+    # edges used by a single triangle lie on a border
+    edges = np.stack([faces, np.roll(faces, -1, axis=1)], axis=2).reshape(-1, 2)
+    pairs = np.sort(edges, axis=1)
+    _, inverse, counts = np.unique(pairs[:, 0] * len(positions) + pairs[:, 1],
+                                   return_inverse=True, return_counts=True)
+    border = counts[inverse.ravel()] == 1
+    if border.any():
+        start, end = positions[edges[border, 0]], positions[edges[border, 1]]
+        sides = np.cross(end - start, np.repeat(normals, 3, axis=0)[border])
+        lengths = np.linalg.norm(sides, axis=1, keepdims=True)
+        sides = sides / np.where(lengths > 0.0, lengths, 1.0)
+        walls = np.hstack([sides, -np.einsum('ij,ij->i', sides, start)[:, None]])
+        walls = border_weight * (walls[:, :, None] * walls[:, None, :]).reshape(-1, 16)
+        points = np.concatenate([points, edges[border, 0], edges[border, 1]])
+        weights = np.concatenate([weights, walls, walls])
+
+    quadrics = np.stack([np.bincount(points, weights[:, k], minlength=len(positions))
+                         for k in range(16)], axis=1)
+    return quadrics.reshape(-1, 4, 4)
+
+
+def _collapse(positions, quadrics, faces, limit):
+    """Collapses up to limit independent edges of least error, in place
+
+    Returns the map from old to new position indices and the largest error
+    of the collapsed edges, or None when no edge can be collapsed without
+    flipping a triangle."""
+    edges = np.sort(np.stack([faces, np.roll(faces, -1, axis=1)], axis=2).reshape(-1, 2), axis=1)
+    edges = np.unique(edges[:, 0] * len(positions) + edges[:, 1])
+    a, b = edges // len(positions), edges % len(positions)
+    quadric = quadrics[a] + quadrics[b]
+
+    # best of the optimal point, either end and the middle of the edge
+    start, end = positions[a], positions[b]
+    middle = (start + end) / 2.0
+    candidates = [start, end, middle]
+    rows = quadric[:, :3, :3]
+    columns = [np.cross(rows[:, 1], rows[:, 2]), np.cross(rows[:, 2], rows[:, 0]),
+               np.cross(rows[:, 0], rows[:, 1])]
+    determinant = np.einsum('ij,ij->i', rows[:, 0], columns[0])
+    solvable = np.abs(determinant) > 1e-10
+    if solvable.any():
+        optimal = -sum(quadric[solvable, k, 3:] * columns[k][solvable] for k in range(3)) / \
+            determinant[solvable, None]
+        # points far off the edge come from nearly flat neighbourhoods
+        near = np.linalg.norm(optimal - middle[solvable], axis=1) <= \
+            np.linalg.norm(end - start, axis=1)[solvable]
+        optimal = np.where(near[:, None], optimal, middle[solvable])
+        candidates.append(middle.copy())
+        candidates[-1][solvable] = optimal
+    costs = np.stack([_quadric_error(quadric, each) for each in candidates], axis=1)
+    choice = np.argmin(costs, axis=1)
+    cost = costs[np.arange(len(edges)), choice]
+    targets = np.stack(candidates, axis=1)[np.arange(len(edges)), choice]
+
+    # an edge is collapsed when it is the cheapest of both of its ends among
+    # the edges left, a few times over so no two collapses share a vertex
+    rank = np.empty(len(edges), dtype=np.int64)
+    rank[np.argsort(cost, kind='stable')] = np.arange(len(edges))
+    taken = np.zeros(len(positions), dtype=bool)
+    free = np.ones(len(edges), dtype=bool)
+    chosen = []
+    for attempt in range(3):
+        best = np.full(len(positions), len(edges), dtype=np.int64)
+        np.minimum.at(best, a[free], rank[free])
+        np.minimum.at(best, b[free], rank[free])
+        found = np.nonzero(free & (best[a] == rank) & (best[b] == rank))[0]
+        chosen.append(found)
+        taken[a[found]] = taken[b[found]] = True
+        free &= ~(taken[a] | taken[b])
+    chosen = np.concatenate(chosen)
+    chosen = chosen[np.argsort(rank[chosen])][:max(limit, 1)]
+
+    while len(chosen) > 0:
+        moved = positions.copy()
+        moved[a[chosen]] = targets[chosen]
+        remap = np.arange(len(positions))
+        remap[b[chosen]] = a[chosen]
+        # triangles around a collapse must keep facing the same way
+        before = faces
+        after = remap[faces]
+        touched = np.zeros(len(positions), dtype=bool)
+        touched[a[chosen]] = touched[b[chosen]] = True
+        check = touched[before].any(axis=1) & (after[:, 0] != after[:, 1]) & \
+            (after[:, 1] != after[:, 2]) & (after[:, 2] != after[:, 0])
+        old = _face_cross(positions, before[check])
+        new = _face_cross(moved, after[check])
+        flipped = np.einsum('ij,ij->i', old, new) <= 0.0
+        if not flipped.any():
+            positions[:] = moved
+            quadrics[a[chosen]] += quadrics[b[chosen]]
+            return remap, float(cost[chosen].max())
+        blocked = np.zeros(len(positions), dtype=bool)
+        blocked[before[check][flipped].ravel()] = True
+        chosen = chosen[~(blocked[a[chosen]] | blocked[b[chosen]])]
+    return None
+
+
+def _quadric_error(quadrics, points):
+    """Returns the error of homogeneous points under (n, 4, 4) quadrics"""
+    points = np.hstack([points, np.ones((len(points), 1))])
+    return (np.matmul(quadrics, points[:, :, None])[:, :, 0] * points).sum(axis=1)
+
+
+def _face_cross(positions, faces):
+    """Returns the unnormalized normals of triangles"""
+    a, b, c = (positions[faces[:, k]] for k in range(3))
+    return np.cross(b - a, c - a)
+
+
+def _simplified(mesh, corners, positions, points, error):
+    """Returns the mesh made of the given corners, moved to the positions of their points
+
+    Corners keep their own normal, texcoord and color, vertices are shared by
+    corners with the same point and attributes."""
+    simplified = dict(mesh, error=error)
+    names = [name for name in ('normals', 'texcoords', 'colors') if mesh.get(name) is not None]
+    corners = corners.ravel()
+    if mesh['indices'] is None:
+        simplified['vertices'] = positions[points[corners]].astype(np.float32)
+        for name in names:
+            simplified[name] = mesh[name][corners]
+        return simplified
+
+    used = np.unique(corners)
+    attributes = np.hstack([np.zeros((len(used), 0), dtype=np.float32)] +
+                           [mesh[name][used].reshape(len(used), -1) for name in names]) + 0.0
+    attributes = np.ascontiguousarray(attributes, dtype=np.float32)
+    _, kinds = np.unique(attributes.view(np.dtype((np.void, 4 * attributes.shape[1]))).ravel()
+                         if attributes.shape[1] else np.zeros(len(used)), return_inverse=True)
+    kind = np.zeros(len(mesh['vertices']), dtype=np.int64)
+    kind[used] = kinds.ravel()
+    keys = points[corners] * (kinds.max() + 1 if len(kinds) else 1) + kind[corners]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+    sources = corners[first[order]]
+    simplified['vertices'] = positions[points[sources]].astype(np.float32)
+    for name in names:
+        simplified[name] = mesh[name][sources]
+    dtype = np.uint16 if len(sources) <= 65536 else np.uint32
+    simplified['indices'] = renumber[inverse.ravel()].astype(dtype)
+    return simplified
+
+
+def optimize(meshes, cache_size=16, overdraw=False):
+    """Yields indexed meshes reordered for the post-transform vertex cache
+
+    Triangles are ordered by tipsify, optionally followed by sort_clusters
+    to draw outer triangles first, and vertices by first use so they are
+    fetched in order. Every mesh gets the 'acmr' of its indices before and
+    after, the average number of cache misses per triangle. Meshes drawn
+    from a soup pass unchanged."""
+    for mesh in meshes:
+        if mesh['indices'] is None or len(mesh['indices']) == 0:
+            yield mesh
+            continue
+        indices = mesh['indices']
+        triangles, clusters = tipsify(indices, len(mesh['vertices']), cache_size)
+        if overdraw:
+            triangles = sort_clusters(mesh['vertices'], indices, triangles, clusters)
+        mesh = dict(mesh, acmr=(acmr(indices, cache_size), None))
+        mesh.update(reorder_vertices(mesh, indices.reshape(-1, 3)[triangles].ravel()))
+        mesh['acmr'] = (mesh['acmr'][0], acmr(mesh['indices'], cache_size))
+        yield mesh
+
+
+def acmr(indices, cache_size=16):
+    """Returns the average cache miss ratio of indices in a FIFO vertex cache"""
+    cache, misses = deque(), 0
+    inside = set()
+    for index in np.asarray(indices).tolist():
+        if index not in inside:
+            misses += 1
+            cache.append(index)
+            inside.add(index)
+            if len(cache) > cache_size:
+                inside.discard(cache.popleft())
+    return misses / max(len(indices) // 3, 1)
+
+
+def tipsify(indices, count, cache_size=16):
+    """Returns an order of the triangles of indices friendly to a vertex cache
+
+    Implements the vertex cache part of Tipsify (Sander, Nehab and Barczak,
+    2007): triangles are emitted in fans around a vertex, moving on to the
+    neighbour still in the cache with the most triangles left. Also returns
+    the positions in the order where a new fan had to be started away from
+    the cache, which split the triangles into clusters."""
+    indices = np.asarray(indices, dtype=np.int64)
+    faces = len(indices) // 3
+    # triangles around every vertex
+    order = np.argsort(indices, kind='stable')
+    adjacency = (order // 3).tolist()
+    starts = np.concatenate([[0], np.cumsum(np.bincount(indices, minlength=count))]).tolist()
+    corners = indices.tolist()
+    live = np.bincount(indices, minlength=count).tolist()
+
+    stamp = [-cache_size - 1] * count
+    emitted = bytearray(faces)
+    dead_end = []
+    triangles, clusters = [], [0]
+    time, cursor, fan = cache_size + 1, 1, corners[0]
+    while fan >= 0:
+        candidates = []
+        for triangle in adjacency[starts[fan]:starts[fan + 1]]:
+            if emitted[triangle]:
+                continue
+            emitted[triangle] = 1
+            triangles.append(triangle)
+            for vertex in corners[3 * triangle:3 * triangle + 3]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if time - stamp[vertex] > cache_size:
+                    stamp[vertex] = time
+                    time += 1
+
+        # the candidate staying longest in the cache that will still be there
+        # once its triangles are emitted
+        fan, best = -1, -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                priority = 0
+                if time - stamp[vertex] + 2 * live[vertex] <= cache_size:
+                    priority = time - stamp[vertex]
+                if priority > best:
+                    fan, best = vertex, priority
+        if fan < 0:
+            while dead_end and fan < 0:
+                vertex = dead_end.pop()
+                if live[vertex] > 0:
+                    fan = vertex
+            while fan < 0 and cursor < count:
+                if live[cursor] > 0:
+                    fan = cursor
+                cursor += 1
+            if fan >= 0 and len(triangles) < faces:
+                clusters.append(len(triangles))
+    return np.array(triangles, dtype=np.int64), np.array(clusters, dtype=np.int64)
+
+
+def sort_clusters(vertices, indices, triangles, clusters):
+    """Returns triangles with their clusters sorted to reduce overdraw
+
+    Clusters facing away from the center of the mesh come first, as they
+    are the most likely to occlude the others (Tipsify's overdraw step,
+    without splitting clusters further)."""
+    corners = np.asarray(vertices, dtype=np.float64)[
+        np.asarray(indices, dtype=np.int64).reshape(-1, 3)[triangles]]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = corners.mean(axis=1)
+    center = (centroids * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-30)
+    weight = np.maximum(np.add.reduceat(areas, clusters), 1e-30)
+    centers = np.add.reduceat(centroids * areas[:, None], clusters) / weight[:, None]
+    directions = _unit(np.add.reduceat(normals, clusters))
+    outward = np.einsum('ij,ij->i', centers - center, directions)
+    ends = np.append(clusters[1:], len(triangles))
+    return np.concatenate([triangles[clusters[k]:ends[k]] for k in np.argsort(-outward, kind='stable')])
+
+
+def reorder_vertices(mesh, indices):
+    """Returns the attributes and indices of a mesh with vertices renumbered by first use"""
+    indices = np.asarray(indices, dtype=np.int64)
+    used, first = np.unique(indices, return_index=True)
+    order = np.concatenate([used[np.argsort(first)],
+                            np.setdiff1d(np.arange(len(mesh['vertices'])), used)])
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+    reordered = {name: mesh[name][order] for name in ('vertices', 'normals', 'texcoords', 'colors')
+                 if mesh.get(name) is not None}
+    reordered['indices'] = renumber[indices].astype(mesh['indices'].dtype)
+    return reordered
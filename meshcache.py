@@ -0,0 +1,274 @@
+import os
+import json
+import shutil
+import struct
+import hashlib
+import numpy as np
+
+from wavefront import mtllib_paths, read_mtl, texture_path, open_file, BLOCK_SIZE
+
+
+class MeshCache():
+    """Directory of processed meshes stored in a compact binary format
+
+    Every entry holds the meshes of one OBJ file, keyed by the contents of
+    the OBJ and its material libraries plus the loader parameters. Entries
+    are evicted least recently used first once the directory grows beyond
+    max_bytes.
+
+    Bundles, single files packing the entries of many OBJ files, are looked
+    up first when found in the directory. They are written ahead of time by
+    bundle and never evicted."""
+
+    MAGIC = b'MESH'
+    BUNDLE_MAGIC = b'MBDL'
+
+    def __init__(self, directory=None, max_bytes=256 * 1024 * 1024):
+        if directory is None:
+            directory = os.path.join(os.path.expanduser('~'), '.cache',
+                                     'mac0420-ep2', 'meshes')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # header of every bundle by path, with its modification time and map
+        self._bundles = {}
+
+    def key(self, filename, *params):
+        """Returns the cache key of an OBJ file loaded with the given parameters
+
+        Whether the textures of the materials are found is part of the key,
+        since untextured parts are stored without texture coordinates. They
+        are keyed by path relative to the OBJ, so entries can be built on
+        another machine."""
+        digest = hashlib.sha1()
+        for path in mtllib_paths(filename, digest):
+            if os.path.exists(path):
+                with open_file(path, 'rb') as f:
+                    for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                        digest.update(block)
+                dirname = os.path.dirname(os.path.abspath(filename))
+                for material in read_mtl(path).values():
+                    texture = texture_path(dirname, material['texture'])
+                    if texture is not None:
+                        texture = os.path.relpath(texture, dirname).replace(os.sep, '/')
+                    digest.update(repr(texture).encode('utf-8'))
+        digest.update(repr(params).encode('utf-8'))
+        return digest.hexdigest()
+
+    def path(self, key):
+        """Returns the file holding a cache entry"""
+        return os.path.join(self.directory, key + '.mesh')
+
+    def load(self, key):
+        """Returns the cached meshes or None when they are not available
+
+        Arrays are read-only views of a memory map of the entry, so their
+        pages are only read when something, like a buffer upload, touches
+        them."""
+        meshes = self._bundled(key)
+        if meshes is not None:
+            return meshes
+        path = self.path(key)
+        try:
+            meshes = self._read(path)
+            # refresh entry for the eviction policy
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError):
+            # corrupted entry, drop it
+            self._remove(path)
+            return None
+        return meshes
+
+    def store(self, key, meshes):
+        """Stores meshes in the cache, ignoring failures to write them"""
+        for mesh in self.spool(key, meshes):
+            pass
+
+    def spool(self, key, meshes):
+        """Stores meshes from an iterable while passing them along
+
+        The arrays of each mesh are written out as it goes by, so a stream of
+        meshes is cached without holding all of them in memory. The entry is
+        created once the iterable is exhausted, failures to write it are
+        ignored."""
+        path = self.path(key)
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        header, offset, f = [], 0, None
+        try:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                f = open(temp + '.data', 'w+b')
+            except OSError:
+                pass
+            for mesh in meshes:
+                if f is not None:
+                    try:
+                        entry, arrays, offset = layout([mesh], offset)
+                        for array, start in arrays:
+                            f.write(array.data)
+                            f.write(b'\0' * (aligned(array.nbytes) - array.nbytes))
+                        header.extend(entry)
+                    except OSError:
+                        f.close()
+                        f = None
+                yield mesh
+            if f is not None:
+                try:
+                    # the header goes first, so the arrays are copied after it
+                    f.seek(0)
+                    with open(temp, 'wb') as out:
+                        self._write_header(out, header)
+                        shutil.copyfileobj(f, out)
+                    os.replace(temp, path)
+                except OSError:
+                    pass
+                else:
+                    self.evict()
+        finally:
+            if f is not None:
+                f.close()
+            self._remove(temp + '.data')
+            self._remove(temp)
+
+    def bundle(self, path, keys):
+        """Packs the entries of keys into a bundle, returning how many were found
+
+        Place the bundle in the directory of a cache for it to be used."""
+        header, offset = {}, 0
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with open(temp + '.data', 'w+b') as f:
+                for key in keys:
+                    meshes = self.load(key)
+                    if meshes is None:
+                        continue
+                    entry, arrays, offset = layout(meshes, offset)
+                    for array, start in arrays:
+                        f.write(array.data)
+                        f.write(b'\0' * (aligned(array.nbytes) - array.nbytes))
+                    header[key] = entry
+                f.seek(0)
+                with open(temp, 'wb') as out:
+                    self._write_header(out, header, self.BUNDLE_MAGIC)
+                    shutil.copyfileobj(f, out)
+            os.replace(temp, path)
+        finally:
+            self._remove(temp + '.data')
+            self._remove(temp)
+        return len(header)
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits max_bytes"""
+        try:
+            entries = [os.path.join(self.directory, name)
+                       for name in os.listdir(self.directory) if name.endswith('.mesh')]
+            entries = [(os.stat(path), path) for path in entries]
+        except OSError:
+            return
+        total = sum(stat.st_size for stat, path in entries)
+        for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= stat.st_size
+
+    def clear(self):
+        """Removes every entry of the cache"""
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.mesh'):
+                    self._remove(os.path.join(self.directory, name))
+
+    def _remove(self, path):
+        """Removes a file if possible"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _write_header(self, f, header, magic=MAGIC):
+        """Writes the header describing the meshes, padded to the array alignment"""
+        header = json.dumps(header).encode('utf-8')
+        prefix = len(magic) + 4
+        f.write(magic + struct.pack('<I', len(header)) + header)
+        f.write(b'\0' * (aligned(prefix + len(header)) - prefix - len(header)))
+
+    def _read(self, path):
+        """Maps meshes written by spool"""
+        header, data = self._map(path, self.MAGIC)
+        return views(header, data)
+
+    def _map(self, path, magic):
+        """Returns the header of a file written by _write_header and a map of the data after it"""
+        with open(path, 'rb') as f:
+            prefix = f.read(len(magic) + 4)
+            if len(prefix) != len(magic) + 4 or prefix[:len(magic)] != magic:
+                raise ValueError("Not a mesh cache entry")
+            size = struct.unpack('<I', prefix[len(magic):])[0]
+            header = json.loads(f.read(size).decode('utf-8'))
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        return header, data[aligned(len(prefix) + size):]
+
+    def _bundled(self, key):
+        """Returns the meshes of key from a bundle of the directory, or None"""
+        try:
+            paths = [os.path.join(self.directory, name)
+                     for name in sorted(os.listdir(self.directory)) if name.endswith('.bundle')]
+        except OSError:
+            return None
+        for path in paths:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+                if path not in self._bundles or self._bundles[path][0] != mtime:
+                    self._bundles[path] = (mtime,) + self._map(path, self.BUNDLE_MAGIC)
+                mtime, header, data = self._bundles[path]
+                if key in header:
+                    return views(header[key], data)
+            except (OSError, ValueError, KeyError):
+                # unreadable bundle, leave it to whoever deployed it
+                self._bundles.pop(path, None)
+        return None
+
+
+def aligned(size, alignment=16):
+    """Rounds size up to the array alignment"""
+    return (size + alignment - 1) // alignment * alignment
+
+
+def layout(meshes, offset=0):
+    """Lays the arrays of meshes out in a single block, starting at offset
+
+    Returns a JSON serializable header describing the meshes, the list of
+    (array, offset) pairs to copy into the block and the block size."""
+    header, arrays = [], []
+    for mesh in meshes:
+        fields, places = {}, {}
+        for name, value in mesh.items():
+            if isinstance(value, np.ndarray):
+                value = np.ascontiguousarray(value)
+                places[name] = {'dtype': value.dtype.str,
+                                'shape': value.shape, 'offset': offset}
+                arrays.append((value, offset))
+                offset += aligned(value.nbytes)
+            else:
+                fields[name] = value
+        header.append({'fields': fields, 'arrays': places})
+    return header, arrays, offset
+
+
+def views(header, data):
+    """Returns the meshes laid out by layout as views of a uint8 block"""
+    meshes = []
+    for entry in header:
+        mesh = dict(entry['fields'])
+        for name, place in entry['arrays'].items():
+            dtype = np.dtype(place['dtype'])
+            offset = place['offset']
+            count = int(np.prod(place['shape'])) * dtype.itemsize
+            if offset + count > len(data):
+                raise ValueError("Truncated mesh block")
+            mesh[name] = data[offset:offset + count].view(
+                dtype).reshape(place['shape'])
+        meshes.append(mesh)
+    return meshes
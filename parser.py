@@ -1,115 +1,392 @@
+import io
+import time
+import ctypes
 import numpy as np
 import os
+from collections import OrderedDict
+from multiprocessing import shared_memory
 from pywavefront import Wavefront
-from PyQt5.QtGui import *
-from Source.Graphics.Material import Material
-from Source.Graphics.WFOParts import WFOParts
+from pywavefront.material import MaterialParser
+from wavefront import iter_obj, texture_path, open_file, find_file, CHUNK_SIZE
+from mesh import weld, merge, nbytes, face_normals, smooth_normals, project_texcoords, lod_chain, \
+    optimize, cleanup
+from meshcache import layout, views
+from profiler import Profile
+
+
+def load_meshes(filename, **kwargs):
+    """Returns the processed meshes of a file, usable from worker processes"""
+    return Parser(filename, **kwargs).get_meshes()
+
+
+def precompile(filename, cache, **kwargs):
+    """Processes a file into the mesh cache, usable from worker processes
+
+    Returns the cache key of the file, the number of triangles of its full
+    meshes and the time spent."""
+    start = time.perf_counter()
+    parser = Parser(filename, cache=cache, **kwargs)
+    triangles = 0
+    for mesh in parser.iter_meshes():
+        if mesh['level'] == 0:
+            triangles += len(mesh['vertices'] if mesh['indices'] is None else mesh['indices']) // 3
+    return parser.cache_key(), triangles, time.perf_counter() - start
+
+
+def compare_paths(filename, memory=False, **kwargs):
+    """Returns the profile reports of loading a file with pywavefront and with the native reader
+
+    Nothing is read from or written to the mesh cache, so both paths do all
+    of their work."""
+    reports = OrderedDict()
+    for path, native in (('pywavefront', False), ('native', True)):
+        profile = Profile(memory=memory)
+        try:
+            Parser(filename, native=native, profile=profile, **kwargs).get_meshes()
+        finally:
+            profile.stop()
+        reports[path] = profile.report()
+    return reports
+
+
+def load_shared_meshes(filename, cache=None, **kwargs):
+    """Loads meshes in a worker process, handing them back through the mesh cache or shared memory
+
+    Returns where the meshes are, the time spent loading them and the
+    profile report of the load. Meshes found in or stored into the cache
+    are only named by their key, ('cache', key), for the caller to map them
+    with MeshCache.load. Others are placed in a shared memory block,
+    ('shared', name, header), that must be claimed with attach_shared_meshes.
+
+    Without merging, meshes stream into the cache one object at a time and
+    are not held, so a file is read again should the cache not take them."""
+    start = time.perf_counter()
+    profile = Profile()
+    parser = Parser(filename, cache=cache, profile=profile, **kwargs)
+    if cache is not None and not kwargs.get('merge', True):
+        for mesh in parser.iter_meshes():
+            pass
+        meshes = None
+    else:
+        meshes = parser.get_meshes()
+    if cache is not None and cache.load(parser.cache_key()) is not None:
+        return ('cache', parser.cache_key()), time.perf_counter() - start, profile.report()
+    if meshes is None:
+        meshes = Parser(filename, profile=profile, **kwargs).get_meshes()
+    header, arrays, size = layout(meshes)
+    with profile.stage('shared memory'):
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        data = np.ndarray((size,), dtype=np.uint8, buffer=block.buf)
+        for array, offset in arrays:
+            data[offset:offset + array.nbytes] = array.reshape(-1).view(np.uint8)
+        del data
+        block.close()
+    return ('shared', block.name, header), time.perf_counter() - start, profile.report()
+
+
+def attach_shared_meshes(name, header):
+    """Returns meshes placed in shared memory by load_shared_meshes, as views of the block
+
+    Nothing is copied. The name of the block is removed right away and its
+    memory is released along with the last array viewing it."""
+    block = SharedBlock(name)
+    return views(header, np.asarray(block))
+
+
+class SharedBlock():
+    """Shared memory block owned by the arrays viewing it
+
+    Arrays made from it keep it as their base, so the block is only closed
+    once none of them is left, and the mapping is never closed under them."""
+
+    def __init__(self, name):
+        self._block = shared_memory.SharedMemory(name=name)
+        # nothing else will attach, the memory stays mapped until closed
+        self._block.unlink()
+        # take the address without holding on to an export of the buffer
+        address = ctypes.addressof(ctypes.c_char.from_buffer(self._block.buf))
+        self.__array_interface__ = {'shape': (self._block.size,), 'typestr': '|u1',
+                                    'data': (address, False), 'version': 3}
+
+    def __del__(self):
+        self._block.close()
+
+
+class CompressedMaterialParser(MaterialParser):
+    """pywavefront material parser also reading compressed libraries, see find_file"""
+
+    def __init__(self, file_name, **kwargs):
+        super(CompressedMaterialParser, self).__init__(
+            find_file(str(file_name)) or file_name, **kwargs)
+
+    def create_line_generator(self):
+        with open_file(str(self.file_name), 'r') as f:
+            yield from f
+
+
+class ObjectWavefront(Wavefront):
+    """Wavefront fed from an in-memory object stream instead of a file"""
+
+    def __init__(self, filename, stream, shared):
+        super(ObjectWavefront, self).__init__(filename, create_materials=True,
+                                              collect_faces=True, parse=False)
+        # vertex attributes are shared among all objects of the source file,
+        # so face indices keep pointing to the right place
+        self.vertices, self.parser.normals, self.parser.tex_coords = shared
+        self.parser.material_parser_cls = CompressedMaterialParser
+        self.parser.lines = iter(stream)
+        self.parse()
 
 
 class Parser():
-    def __init__(self, filename, scene):
+    """Reads an OBJ file, plain or compressed, into processed meshes, without touching Qt or OpenGL
+
+    A mesh is a dictionary of numpy arrays, the parameters of its material
+    and its detail level, ready to be uploaded by WFObject or stored by
+    MeshCache.
+
+    The native reader goes through the file chunk_size characters at a
+    time, and without merge every object is yielded as soon as it is read.
+    Merging, the default, draws each material once but holds the meshes of
+    the whole file, so memory is only bounded by chunk_size with merge off."""
+
+    # bump whenever the processed meshes change, invalidating cached ones
+    version = 9
+
+    def __init__(self, filename, native=True, weld=True, cache=None, meshes=None,
+                 chunk_size=CHUNK_SIZE, crease_angle=None, uv_mapping='box', keep_texcoords=False,
+                 merge=True, vertex_colors=True, lod_levels=3, lod_ratio=0.5,
+                 optimize=True, overdraw=False, cleanup=True, profile=None):
         self._filename = filename
         self._dirname = os.path.dirname(os.path.abspath(filename))
-        self._filenames = []
-        self._WFOParts = []
-        self._world = scene
+        self._meshes = meshes
+        self._native = native
+        self._weld = weld
+        self._cache = cache
+        self._cache_key = None
+        self._chunk_size = chunk_size
+        # None keeps flat normals where the file has none
+        self._crease_angle = crease_angle
+        # projection of the texcoords made up for textured parts without them
+        self._uv_mapping = uv_mapping
+        # False leaves texcoords out of parts whose texture is not found
+        self._keep_texcoords = keep_texcoords
+        # one draw per material, at the cost of holding the whole file, which
+        # turns streaming off
+        self._merge = merge
+        # materials differing in diffuse color only become vertex colors
+        self._vertex_colors = vertex_colors
+        # simplified copies of every mesh, each with lod_ratio of the triangles of the last
+        self._lod_levels = lod_levels
+        self._lod_ratio = lod_ratio
+        # triangles reordered for the vertex cache, and by clusters against overdraw
+        self._optimize = optimize
+        self._overdraw = overdraw
+        # degenerate and duplicate triangles and unused vertices dropped before simplifying
+        self._cleanup = cleanup
         self.scale = 10
+        self.soup_bytes = 0
+        self.indexed_bytes = 0
+        # cache misses before and after reordering, and the triangles they are over
+        self.misses = [0.0, 0.0]
+        self.triangles = 0
+        # triangles and vertices dropped by the cleanup
+        self.removed = {'degenerate': 0, 'duplicate': 0, 'unreferenced': 0}
+        # time and memory spent in every stage of the load
+        self.profile = Profile() if profile is None else profile
+
+    def iter_counted_meshes(self):
+        """Yields the meshes of iter_meshes, adding the full ones to the byte counts, cache misses
+        and cleanup counts"""
+        for mesh in self.iter_meshes():
+            indices = mesh['indices']
+            attributes = (mesh['vertices'], mesh['normals'],
+                          mesh['texcoords'], mesh['colors'])
+            if mesh['level'] == 0:
+                for name, removed in mesh.get('removed', {}).items():
+                    self.removed[name] += removed
+                count = len(mesh['vertices']) if indices is None else len(indices)
+                self.soup_bytes += count * \
+                    sum(each.itemsize * each.shape[1] for each in attributes if each is not None)
+                self.indexed_bytes += nbytes(indices, *attributes)
+                if mesh.get('acmr') is not None:
+                    faces = len(indices) // 3
+                    self.misses[0] += mesh['acmr'][0] * faces
+                    self.misses[1] += mesh['acmr'][1] * faces
+                    self.triangles += faces
+            yield mesh
+
+    def acmr(self):
+        """Returns the average cache miss ratio of the parts before and after reordering"""
+        if self.triangles == 0:
+            return None
+        return (self.misses[0] / self.triangles, self.misses[1] / self.triangles)
+
+    def report(self):
+        """Returns the counters of every stage of the load, see Profile.report"""
+        return self.profile.report()
+
+    def get_meshes(self):
+        """Returns the processed arrays and material parameters of every part"""
+        if self._meshes is None:
+            self._meshes = list(self.iter_meshes())
+        return self._meshes
+
+    def iter_meshes(self):
+        """Yields the processed arrays and material parameters of every part
 
-    def get_WFOParts(self):
+        Without merging, meshes are yielded as soon as each object of the
+        file is read and are not kept, so a file can be uploaded while
+        holding the text of a single chunk and the triangles of a single
+        object. Simplified levels of a mesh follow it, with increasing
+        'level'."""
+        if self._meshes is not None:
+            yield from self._meshes
+            return
 
-        for filename in self._get_filenames():
+        profile = self.profile
+        meshes = None
+        if self._cache is not None:
+            with profile.stage('cache key'):
+                key = self.cache_key()
+            with profile.stage('cache load'):
+                meshes = self._cache.load(key)
+            if meshes is not None:
+                yield from meshes
+                return
 
-            scene = Wavefront(filename, create_materials=True,
-                              collect_faces=True)
+        if self._native:
+            meshes = profile.iterate('build', self._get_native_meshes())
+        else:
+            meshes = profile.iterate('build', self._get_wavefront_meshes())
+        if self._merge:
+            meshes = profile.iterate('merge', merge(meshes, self._vertex_colors))
+        if self._cleanup:
+            meshes = profile.iterate('cleanup', cleanup(meshes))
+        if self._lod_levels:
+            meshes = profile.iterate('simplify', lod_chain(meshes, self._lod_levels, self._lod_ratio))
+        if self._optimize and self._weld:
+            meshes = profile.iterate('optimize', optimize(meshes, overdraw=self._overdraw))
+        if self._cache is not None:
+            meshes = profile.iterate('cache store', self._cache.spool(key, meshes))
+        yield from meshes
+
+    def params(self):
+        """Returns the parameters that change the processed meshes"""
+        return (self.version, self.scale, self._native, self._weld, self._crease_angle,
+                self._uv_mapping, self._keep_texcoords, self._merge, self._vertex_colors,
+                self._lod_levels, self._lod_ratio, self._optimize, self._overdraw, self._cleanup)
+
+    def cache_key(self):
+        """Returns the key of the processed meshes in the mesh cache"""
+        if self._cache_key is None:
+            self._cache_key = self._cache.key(self._filename, *self.params())
+        return self._cache_key
+
+    def geometry_key(self):
+        """Returns a key telling apart loads of different files, file versions or parameters"""
+        stat = os.stat(self._filename)
+        return (os.path.abspath(self._filename), stat.st_mtime_ns, stat.st_size) + self.params()
+
+    def _get_native_meshes(self):
+        """Builds the meshes with the vectorized reader"""
+        materials = {}
+        for obj, name, vertices, normals, texcoords in self.profile.iterate('parse', iter_obj(
+                self._filename, materials, self._chunk_size)):
+            vertices = vertices / self.scale
+            if normals is None:  # sem normais
+                with self.profile.stage('normals'):
+                    normals = self._calculate_normals(vertices)
+            texcoords = self._texcoords(materials[name], vertices, texcoords)
+            yield self._mesh(materials[name], vertices, normals, texcoords)
+
+    def _texcoords(self, material, vertices, texcoords):
+        """Returns the texcoords of a part, None when no texture will read them"""
+        with self.profile.stage('texcoords'):
+            if not self._keep_texcoords and \
+                    texture_path(self._dirname, material['texture']) is None:
+                return None
+            if texcoords is None:  # sem textura
+                return self._calculate_texcoords(vertices)
+            return np.asarray(texcoords, dtype=np.float32)
+
+    def _mesh(self, material, vertices, normals, texcoords):
+        """Returns a mesh, welding its triangle soup into an indexed one"""
+        indices = None
+        if self._weld:
+            with self.profile.stage('weld'):
+                vertices, normals, texcoords, indices = weld(
+                    vertices, normals, texcoords)
+        return {'material': material, 'vertices': vertices,
+                'normals': normals, 'texcoords': texcoords,
+                'colors': None, 'indices': indices, 'level': 0, 'error': 0.0}
+
+    def _get_wavefront_meshes(self):
+        """Builds the meshes with pywavefront"""
+        shared = ([], [], [])
+
+        for stream in self.profile.iterate('split', self._get_objects()):
+
+            with self.profile.stage('pywavefront'):
+                scene = ObjectWavefront(self._filename, stream, shared)
 
             for name, material in scene.materials.items():
-                emission = QVector3D(*material.emissive[0:3])
-                ambient = QVector3D(*material.ambient[0:3])
-                diffuse = QVector3D(*material.diffuse[0:3])
-                specular = QVector3D(*material.specular[0:3])
-                shininess = material.shininess
-                materials = Material(emission=emission, ambient=ambient,
-                                     diffuse=diffuse, specular=specular, shininess=shininess)
+                materials = {'emission': material.emissive[0:3], 'ambient': material.ambient[0:3],
+                             'diffuse': material.diffuse[0:3], 'specular': material.specular[0:3],
+                             'shininess': material.shininess,
+                             'texture': material.texture.name if material.texture else None}
 
                 texcoords, normals, vertices = [], [], []
                 if material.vertex_format == 'T2F_N3F_V3F':  # completo
-                    all_vertices = np.array(material.vertices, dtype=np.float32).reshape(
-                        (len(material.vertices)//8, 8))
-                    texcoords = all_vertices[:, 0:2] / self.scale
-                    normals = all_vertices[:, 2:5] / self.scale
+                    with self.profile.stage('convert'):
+                        all_vertices = np.array(material.vertices, dtype=np.float32).reshape(
+                            (len(material.vertices)//8, 8))
+                    normals = all_vertices[:, 2:5]
                     vertices = all_vertices[:, 5:] / self.scale
-                    part = WFOParts(self._world, vertices=vertices,
-                                    normals=normals, texcoords=texcoords, material=materials)
-                    self._WFOParts.append(part)
+                    texcoords = self._texcoords(materials, vertices, all_vertices[:, 0:2])
+                    yield self._mesh(materials, vertices, normals, texcoords)
                 elif material.vertex_format == 'T2F_V3F':  # sem normais
-                    all_vertices = np.array(material.vertices, dtype=np.float32).reshape(
-                        (len(material.vertices)//5, 5))
-                    texcoords = all_vertices[:, 0:2] / self.scale
+                    with self.profile.stage('convert'):
+                        all_vertices = np.array(material.vertices, dtype=np.float32).reshape(
+                            (len(material.vertices)//5, 5))
                     vertices = all_vertices[:, 2:] / self.scale
-                    normals = self._calculate_normals(vertices)
-                    part = WFOParts(self._world, vertices=vertices,
-                                    normals=normals, texcoords=texcoords, material=materials)
-                    self._WFOParts.append(part)
+                    with self.profile.stage('normals'):
+                        normals = self._calculate_normals(vertices)
+                    texcoords = self._texcoords(materials, vertices, all_vertices[:, 0:2])
+                    yield self._mesh(materials, vertices, normals, texcoords)
                 elif material.vertex_format == 'N3F_V3F':  # sem textura
-                    all_vertices = np.array(material.vertices, dtype=np.float32).reshape(
-                        (len(material.vertices)//6, 6))
-                    texcoords = self._calculate_texcoords(vertices)
-                    normals = all_vertices[:, 0:3] / self.scale
+                    with self.profile.stage('convert'):
+                        all_vertices = np.array(material.vertices, dtype=np.float32).reshape(
+                            (len(material.vertices)//6, 6))
+                    normals = all_vertices[:, 0:3]
                     vertices = all_vertices[:, 3:] / self.scale
-                    part = WFOParts(self._world, vertices=vertices,
-                                    normals=normals, texcoords=texcoords, material=materials)
-                    self._WFOParts.append(part)
-        self._cleanup()
-        return self._WFOParts
-
-    def _get_filenames(self):
-        f = open(self._filename, 'r').readlines()
-
-        for index, obj in enumerate(self._get_objects(f)):
-            filename = '{0}/{1}_{1}.obj'.format(self._dirname, index)
-            self._filenames.append(filename)
-            np.savetxt(fname=filename, X=obj, fmt='%s')
-
-        return self._filenames
-
-    def _get_objects(self, f):
-        objects = []
-        i = 0
-        while i < len(f):
-            if i+1 == len(f) or 'f ' in f[i] and 'v ' in f[i+1]:
-                obj = f[:i+1]
-                objects.append(obj)
-
-                if i+1 < len(f):
-                    to_delete = []
-                    for j in range(i+1):
-                        if '#' in f[j] or 'o ' in f[j] or 'usemtl' in f[j] or 'f ' in f[j]:
-                            to_delete.append(f[j])
-                    for j in range(len(to_delete)):
-                        f.remove(to_delete[j])
-                    i = 0
-                    continue
-            i += 1
-        return objects
-
-    def _cleanup(self):
-        for filename in self._filenames:
-            os.remove(filename)
+                    texcoords = self._texcoords(materials, vertices, None)
+                    yield self._mesh(materials, vertices, normals, texcoords)
+
+    def _get_objects(self):
+        """Splits the file into objects, yielding each one as a stream"""
+        header, lines, last = [], [], None
+        with open_file(self._filename, 'r') as f:
+            for line in f:
+                key = line.split(None, 1)[0] if line.strip() else None
+                # a vertex right after a face starts a new object
+                if key == 'v' and last == 'f':
+                    yield io.StringIO(''.join(lines))
+                    lines = list(header)
+                if key == 'mtllib':
+                    header.append(line)
+                if key is not None:
+                    last = key
+                lines.append(line)
+        if lines:
+            yield io.StringIO(''.join(lines))
 
     def _calculate_normals(self, vertices):
-        normals = []
-        for i in range(0, len(vertices), 3):
-            a = vertices[i]
-            b = vertices[i+1]
-            c = vertices[i+2]
-            ab = a-b
-            cb = c-b
-            n = np.cross(cb, ab)
-            normals.append(n)
-            normals.append(n)
-            normals.append(n)
-        return np.array(normals).reshape(vertices.shape)
+        """Returns face normals, smoothed up to the crease angle when it is set"""
+        if self._crease_angle is None:
+            return face_normals(vertices)
+        return smooth_normals(vertices, self._crease_angle)
 
     def _calculate_texcoords(self, vertices):
-        lines = len(vertices) // 3
-        return np.zeros((lines, 2))
+        """Returns texcoords projected with the configured mapping"""
+        return project_texcoords(vertices, self._uv_mapping)
@@ -0,0 +1,155 @@
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class Profile():
+    """Named timing and allocation counters of the stages of an import
+
+    Time and memory spent in a stage entered while another one runs count
+    for the inner stage only, so the stages of a pipeline of generators add
+    up to the time of the whole import. Allocations are only counted when
+    memory is True, as tracing them slows everything else down."""
+
+    def __init__(self, memory=False, report=None):
+        self.memory = memory
+        self._stages = OrderedDict()
+        # counters of the stages running, innermost last
+        self._running = []
+        self._tracing = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        if report is not None:
+            self.extend(report)
+
+    @contextmanager
+    def stage(self, name):
+        """Counts the time and allocations of the enclosed code for stage name"""
+        frame = {'inner': 0.0, 'allocated': 0, 'peak': 0}
+        memory = self.memory and tracemalloc.is_tracing()
+        if memory:
+            before, peak = tracemalloc.get_traced_memory()
+            if self._running:
+                self._running[-1]['peak'] = max(self._running[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['peak'] = before
+        self._running.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._running.pop()
+            allocated = 0
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                allocated = current - before
+                frame['peak'] = max(frame['peak'], peak)
+            if self._running:
+                self._running[-1]['inner'] += elapsed
+                self._running[-1]['allocated'] += allocated
+                self._running[-1]['peak'] = max(self._running[-1]['peak'], frame['peak'])
+            counters = self._counters(name)
+            counters['calls'] += 1
+            counters['seconds'] += elapsed - frame['inner']
+            counters['allocated'] += allocated - frame['allocated']
+            if memory:
+                counters['peak'] = max(counters['peak'], frame['peak'] - before)
+
+    def iterate(self, name, iterable):
+        """Yields the items of iterable, counting the time taken to produce them for stage name"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def extend(self, report):
+        """Adds the counters of a report, such as one made in a worker process"""
+        for name, values in report.items():
+            counters = self._counters(name)
+            counters['calls'] += values['calls']
+            counters['seconds'] += values['seconds']
+            counters['allocated'] += values['allocated']
+            counters['peak'] = max(counters['peak'], values['peak'])
+
+    def report(self):
+        """Returns the counters of every stage, in the order they first ran
+
+        Each stage maps to its number of calls, the seconds spent in it, the
+        bytes it allocated and did not free and the most bytes allocated at
+        once while it ran, inner stages included. Byte counts are zero
+        unless memory is traced."""
+        return OrderedDict((name, dict(counters)) for name, counters in self._stages.items())
+
+    def stop(self):
+        """Stops tracing allocations, if this profile started it"""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def _counters(self, name):
+        """Returns the counters of a stage, creating them on first use"""
+        if name not in self._stages:
+            self._stages[name] = {'calls': 0, 'seconds': 0.0, 'allocated': 0, 'peak': 0}
+        return self._stages[name]
+
+
+def total(report):
+    """Returns the seconds spent in all stages of a report"""
+    return sum(counters['seconds'] for counters in report.values())
+
+
+def format_report(report, title=None):
+    """Returns a report as a table, one stage per line"""
+    lines = [] if title is None else [title]
+    lines.append('{:<14} {:>6} {:>10} {:>12} {:>12}'.format(
+        'stage', 'calls', 'ms', 'allocated', 'peak'))
+    for name, counters in report.items():
+        lines.append('{:<14} {:>6} {:>10.1f} {:>12} {:>12}'.format(
+            name, counters['calls'], counters['seconds'] * 1e3,
+            _size(counters['allocated']), _size(counters['peak'])))
+    lines.append('{:<14} {:>6} {:>10.1f}'.format('total', '', total(report) * 1e3))
+    return '\n'.join(lines)
+
+
+def format_comparison(reports):
+    """Returns the reports of several code paths side by side, in ms per stage"""
+    names = list(OrderedDict.fromkeys(name for report in reports.values() for name in report))
+    lines = ['{:<14}'.format('stage') + ''.join('{:>14}'.format(path) for path in reports)]
+    for name in names:
+        lines.append('{:<14}'.format(name) + ''.join(
+            '{:>14.1f}'.format(report[name]['seconds'] * 1e3) if name in report else '{:>14}'.format('-')
+            for report in reports.values()))
+    lines.append('{:<14}'.format('total') + ''.join(
+        '{:>14.1f}'.format(total(report) * 1e3) for report in reports.values()))
+    return '\n'.join(lines)
+
+
+def _size(count):
+    """Returns a byte count in readable units"""
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(count) < 1024:
+            return '{:.0f} {}'.format(count, unit)
+        count /= 1024.0
+    return '{:.1f} GiB'.format(count)
+
+
+if __name__ == '__main__':
+    # compare the import paths on the files given
+    from parser import compare_paths
+    memory = '--memory' in sys.argv[1:]
+    for filename in sys.argv[1:]:
+        if filename != '--memory':
+            reports = compare_paths(filename, memory=memory)
+            print(filename)
+            print(format_comparison(reports))
+            if memory:
+                for path, report in reports.items():
+                    print(format_report(report, path))
@@ -0,0 +1,49 @@
+import os
+import time
+
+import pytest
+
+from PyQt5.QtCore import QCoreApplication
+
+from Source.Graphics.FileWatcher import FileWatcher
+
+
+@pytest.fixture(scope='module')
+def application():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def settle(application, watcher, timeout=10.0):
+    """Delivers the digests of the worker thread until none is pending"""
+    end = time.monotonic() + timeout
+    application.processEvents()
+    while watcher._pending and time.monotonic() < end:
+        time.sleep(0.01)
+        application.processEvents()
+    assert not watcher._pending
+
+
+def test_only_edits_are_reported(application, tmp_path):
+    obj, mtl = tmp_path / 'box.obj', tmp_path / 'box.mtl'
+    obj.write_text('mtllib box.mtl\nv 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\n')
+    mtl.write_text('newmtl red\nKd 1 0 0\n')
+    watcher, changed = FileWatcher(), []
+    watcher.changed.connect(changed.append)
+    watcher.watch(str(obj))
+    settle(application, watcher)
+
+    # same contents, newer time
+    stat = os.stat(str(obj))
+    os.utime(str(obj), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    watcher.poll()
+    settle(application, watcher)
+    assert changed == []
+
+    with open(str(mtl), 'a') as f:
+        f.write('Ks 1 1 1\n')
+    watcher.poll()
+    settle(application, watcher)
+    assert changed == [str(obj)]
+
+    watcher.unwatch(str(obj))
+    assert watcher.files() == []
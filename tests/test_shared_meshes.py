@@ -0,0 +1,75 @@
+import gc
+import os
+import tracemalloc
+import weakref
+
+import numpy as np
+
+from meshcache import MeshCache
+from parser import load_shared_meshes, attach_shared_meshes, load_meshes, SharedBlock
+
+MILL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    'obj-models', 'low-poly-mill', 'low-poly-mill.obj')
+
+
+def owner(array):
+    """Returns the shared block an array views"""
+    while not isinstance(array, SharedBlock):
+        array = array.base
+    return array
+
+
+def test_attached_meshes_view_the_block():
+    (where, name, header), elapsed, report = load_shared_meshes(MILL)
+    tracemalloc.start()
+    try:
+        meshes = attach_shared_meshes(name, header)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    size = sum(value.nbytes for mesh in meshes for value in mesh.values()
+               if isinstance(value, np.ndarray))
+    # the arrays are not copied out of the block
+    assert peak < size / 4
+
+    for mesh, expected in zip(meshes, load_meshes(MILL)):
+        for name, value in expected.items():
+            if isinstance(value, np.ndarray):
+                assert np.array_equal(mesh[name], value)
+
+
+def test_block_lives_as_long_as_its_arrays():
+    (where, name, header), elapsed, report = load_shared_meshes(MILL)
+    meshes = attach_shared_meshes(name, header)
+    normals = meshes[0]['normals']
+    block = weakref.ref(owner(normals))
+    expected = normals.copy()
+    del meshes
+    gc.collect()
+    assert block() is not None
+    assert np.array_equal(normals, expected)
+    del normals
+    gc.collect()
+    assert block() is None
+
+
+def test_cached_meshes_are_named_by_key(tmp_path):
+    cache = MeshCache(str(tmp_path))
+    place, elapsed, report = load_shared_meshes(MILL, cache=cache)
+    assert place[0] == 'cache'
+    for mesh, expected in zip(cache.load(place[1]), load_meshes(MILL)):
+        assert isinstance(mesh['vertices'].base, np.memmap)
+        assert np.array_equal(mesh['vertices'], expected['vertices'])
+
+
+def test_streamed_meshes_fall_back_to_shared_memory(tmp_path):
+    unwritable = tmp_path / 'file'
+    unwritable.write_text('')
+    for cache, where in ((MeshCache(str(tmp_path)), 'cache'), (MeshCache(str(unwritable)), 'shared')):
+        place, elapsed, report = load_shared_meshes(MILL, cache=cache, merge=False)
+        assert place[0] == where
+        meshes = cache.load(place[1]) if where == 'cache' else attach_shared_meshes(*place[1:])
+        expected = load_meshes(MILL, merge=False)
+        assert len(meshes) == len(expected)
+        for mesh, mesh_expected in zip(meshes, expected):
+            assert np.array_equal(mesh['indices'], mesh_expected['indices'])
@@ -0,0 +1,111 @@
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtGui import QGuiApplication, QOpenGLShaderProgram
+
+from meshcache import MeshCache
+
+# Loads a mesh of a million triangles from the cache into an actor whose
+# buffers are stand-ins for the OpenGL ones, copying what they are handed
+# into arrays as the driver would. Memory-mapped arrays are not traced, so
+# the peak traced is what loading allocates on top of the mapped entry.
+
+TRIANGLES = 1000000
+# peak allowed relative to the buffer contents, a copy of the index array
+# on the way to the buffer would go over it
+BUDGET = 1.25
+
+
+class Buffer():
+    """Vertex or index buffer keeping its contents in an array"""
+
+    def __init__(self):
+        self.data = None
+        self.sources = []
+
+    def allocate(self, size):
+        self.data = np.empty(size, dtype=np.uint8)
+
+    def write(self, offset, data, count):
+        self.sources.append(data)
+        self.data[offset:offset + count] = np.frombuffer(data, dtype=np.uint8, count=count)
+
+    def setUsagePattern(self, usage):
+        pass
+
+    def create(self):
+        return True
+
+    def bind(self):
+        return True
+
+    def release(self, *args):
+        pass
+
+
+class VertexArray():
+    """Vertex array object doing nothing"""
+
+    def create(self):
+        return True
+
+    def bind(self):
+        pass
+
+    def release(self):
+        pass
+
+
+def grid(triangles):
+    """Returns a welded grid of at least the given number of triangles"""
+    side = int(np.ceil(np.sqrt(triangles / 2.0))) + 1
+    u, v = np.meshgrid(np.linspace(0.0, 1.0, side, dtype=np.float32),
+                       np.linspace(0.0, 1.0, side, dtype=np.float32))
+    vertices = np.stack([u, np.sin(u * 6.0) * np.cos(v * 6.0), v], -1).reshape(-1, 3)
+    normals = np.zeros_like(vertices)
+    normals[:, 1] = 1.0
+    corners = (np.arange(side - 1)[None, :] + side * np.arange(side - 1)[:, None]).reshape(-1)
+    indices = np.stack([corners, corners + side, corners + 1,
+                        corners + 1, corners + side, corners + side + 1], -1)
+    return {'vertices': vertices, 'normals': normals,
+            'texcoords': np.stack([u, v], -1).reshape(-1, 2),
+            'indices': indices.reshape(-1).astype(np.uint32)}
+
+
+@pytest.fixture(scope='module')
+def application():
+    return QGuiApplication.instance() or QGuiApplication([])
+
+
+def test_cached_load_peaks_near_gpu_size(application, tmp_path, monkeypatch):
+    from Source.Graphics.Actor import Actor
+
+    for name in ('setAttributeBuffer', 'enableAttributeArray'):
+        monkeypatch.setattr(QOpenGLShaderProgram, name, lambda self, *args: None)
+
+    cache = MeshCache(str(tmp_path))
+    cache.store('grid', [grid(TRIANGLES)])
+    actor = Actor(None)
+    actor._vao, actor._vbo, actor._ibo = VertexArray(), Buffer(), Buffer()
+
+    tracemalloc.start()
+    try:
+        mesh, = cache.load('grid')
+        actor.create(vertices=mesh['vertices'], normals=mesh['normals'],
+                     texcoords=mesh['texcoords'], indices=mesh['indices'])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert actor._num_indices >= 3 * TRIANGLES
+    size = actor._vbo.data.nbytes + actor._ibo.data.nbytes
+    # the arrays written are the mapped ones, not copies of them
+    for data in actor._vbo.sources + actor._ibo.sources:
+        assert any(np.shares_memory(data, array) for array in mesh.values())
+    assert peak < BUDGET * size, '{:.1f} MiB peak for {:.1f} MiB of buffers'.format(
+        peak / 2 ** 20, size / 2 ** 20)
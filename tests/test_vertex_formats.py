@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import pytest
+
+from mesh import quantize_positions, pack_normals
+from parser import load_meshes
+
+# Shades meshes with their float32 attributes and with the compact vertex
+# formats decoded the way OpenGL reads them, comparing the intensities of
+# every vertex. One step of an 8 bit framebuffer is 1/255.
+
+MODELS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'obj-models')
+
+# largest difference in Lambert and Phong intensity, in framebuffer steps
+MAX_DIFFUSE_ERROR = 1.0 / 255
+MAX_SPECULAR_ERROR = 3.0 / 255
+SHININESS = 12.0
+
+
+def decode_positions(packed, scale, offset):
+    """Returns the positions the shaders restore from quantize_positions"""
+    local = packed[:, :3].astype(np.float32)
+    if np.issubdtype(packed.dtype, np.integer):
+        local = np.maximum(local / np.iinfo(packed.dtype).max, -1.0)
+    return local * scale + offset
+
+
+def decode_normals(packed):
+    """Returns the normals OpenGL reads from GL_INT_2_10_10_10_REV, normalized"""
+    fields = np.stack([(packed >> shift) & 0x3FF for shift in (0, 10, 20)], axis=1).astype(np.int32)
+    fields[fields >= 512] -= 1024
+    return np.maximum(fields / 511.0, -1.0)
+
+
+def shade(positions, normals, light, eye):
+    """Returns the Lambert and Phong intensities of every vertex for a point light"""
+    normals = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    to_light = light - positions
+    to_light /= np.linalg.norm(to_light, axis=1, keepdims=True)
+    to_eye = eye - positions
+    to_eye /= np.linalg.norm(to_eye, axis=1, keepdims=True)
+    diffuse = np.maximum((normals * to_light).sum(axis=1), 0.0)
+    reflected = 2.0 * (normals * to_light).sum(axis=1, keepdims=True) * normals - to_light
+    specular = np.maximum((reflected * to_eye).sum(axis=1), 0.0) ** SHININESS
+    return diffuse, np.where(diffuse > 0.0, specular, 0.0)
+
+
+def sphere(count=64):
+    """Returns the positions and smooth normals of a UV sphere"""
+    u, v = np.meshgrid(np.linspace(0, 2 * np.pi, count), np.linspace(0.05, np.pi - 0.05, count))
+    normals = np.stack([np.sin(v) * np.cos(u), np.cos(v), np.sin(v) * np.sin(u)], -1).reshape(-1, 3)
+    return (normals * 3.0 + [1.0, -2.0, 0.5]).astype(np.float32), normals.astype(np.float32)
+
+
+def meshes():
+    """Yields the name, positions and normals of the meshes shaded"""
+    yield 'sphere', sphere()
+    for name in ('low-poly-mill/low-poly-mill.obj', 'buildings/7.obj'):
+        for index, mesh in enumerate(load_meshes(os.path.join(MODELS, name), lod_levels=0)):
+            normals = mesh['normals']
+            keep = np.linalg.norm(normals, axis=1) > 0.0
+            yield '{}:{}'.format(name, index), (mesh['vertices'][keep], normals[keep])
+
+
+@pytest.mark.parametrize('dtype', [np.int16, np.float16], ids=['normalized', 'half'])
+def test_compact_formats_shade_like_float(dtype):
+    for name, (positions, normals) in meshes():
+        packed, scale, offset = quantize_positions(positions, dtype)
+        decoded_positions = decode_positions(packed, scale, offset)
+        decoded_normals = decode_normals(pack_normals(normals))
+
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        center, size = (low + high) / 2.0, float(np.linalg.norm(high - low))
+        for light in ([1.0, 1.0, 1.0], [-1.0, 0.5, -0.2], [0.2, -1.0, 0.7]):
+            light = center + size * np.asarray(light)
+            eye = center + size * np.asarray([0.3, 0.4, 1.5])
+            diffuse, specular = shade(positions, normals, light, eye)
+            compact_diffuse, compact_specular = shade(decoded_positions, decoded_normals, light, eye)
+            assert np.abs(compact_diffuse - diffuse).max() < MAX_DIFFUSE_ERROR, name
+            assert np.abs(compact_specular - specular).max() < MAX_SPECULAR_ERROR, name
+
+
+def test_packed_normals_keep_their_direction():
+    normals = np.random.default_rng(0).normal(size=(10000, 3)).astype(np.float32)
+    decoded = decode_normals(pack_normals(normals))
+    cosines = (decoded / np.linalg.norm(decoded, axis=1, keepdims=True) *
+               normals / np.linalg.norm(normals, axis=1, keepdims=True)).sum(axis=1)
+    # under a third of a degree off
+    assert np.degrees(np.arccos(np.minimum(cosines, 1.0))).max() < 0.35
+
+
+def test_half_texcoords_stay_within_half_a_texel():
+    texcoords = np.random.default_rng(0).random((10000, 2)).astype(np.float32)
+    error = np.abs(texcoords.astype(np.float16).astype(np.float32) - texcoords).max()
+    # of a 1024 texel wide image
+    assert error < 0.5 / 1024
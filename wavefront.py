@@ -0,0 +1,364 @@
+import os
+import re
+import bz2
+import gzip
+import lzma
+import numpy as np
+from collections import OrderedDict
+
+
+# decompressors of files read compressed, by extension
+COMPRESSIONS = OrderedDict([('.gz', gzip.open), ('.xz', lzma.open), ('.bz2', bz2.open)])
+
+# extensions of the OBJ files read, plain or compressed
+OBJ_EXTENSIONS = ('.obj',) + tuple('.obj' + extension for extension in COMPRESSIONS)
+
+
+def open_file(filename, mode='r'):
+    """Opens a file for reading, decompressing it as it is read when its extension is a compression's
+
+    Nothing is expanded to disk, reads are streamed through the decompressor."""
+    opener = COMPRESSIONS.get(os.path.splitext(filename)[1].lower())
+    if opener is None:
+        return open(filename, mode)
+    return opener(filename, mode if 'b' in mode else mode + 't')
+
+
+def find_file(path):
+    """Returns path, or a compressed copy of it when only that one exists, or None"""
+    if os.path.exists(path):
+        return path
+    for extension in COMPRESSIONS:
+        if os.path.exists(path + extension):
+            return path + extension
+    return None
+
+
+def is_obj(filename):
+    """Returns whether a file name is one of an OBJ file, plain or compressed"""
+    return filename.lower().endswith(OBJ_EXTENSIONS)
+
+
+def read_mtl(filename):
+    """Reads a material library into a dictionary of material parameters"""
+    materials = OrderedDict()
+    material = None
+    with open_file(filename, 'r') as f:
+        for line in f:
+            values = line.split()
+            if not values or values[0].startswith('#'):
+                continue
+            key = values[0]
+            if key == 'newmtl':
+                material = _default_material()
+                materials[' '.join(values[1:])] = material
+            elif material is None:
+                continue
+            elif key == 'Ka':
+                material['ambient'] = _color(values[1:])
+            elif key == 'Kd':
+                material['diffuse'] = _color(values[1:])
+            elif key == 'Ks':
+                material['specular'] = _color(values[1:])
+            elif key == 'Ke':
+                material['emission'] = _color(values[1:])
+            elif key == 'Ns':
+                material['shininess'] = float(values[1])
+            elif key == 'map_Kd':
+                material['texture'] = line.split(None, 1)[1].strip()
+    return materials
+
+
+def mtllib_paths(filename, digest=None, block_size=None):
+    """Returns the material libraries referenced by an OBJ file
+
+    The file is read in blocks of block_size bytes, each one also fed to
+    digest when given, so it can be hashed in the same pass without ever
+    being held whole. Libraries found compressed only are returned by their
+    compressed file, see find_file."""
+    block_size = block_size or BLOCK_SIZE
+    names, rest = [], b''
+    with open_file(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            if digest is not None:
+                digest.update(block)
+            # keep the partial last line for the next block
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            names.extend(re.findall(rb'^mtllib[ \t]+(.*)$', block[:end], re.M))
+    names.extend(re.findall(rb'^mtllib[ \t]+(.*)$', rest, re.M))
+    dirname = os.path.dirname(os.path.abspath(filename))
+    paths = [os.path.join(dirname, name.decode('utf-8').strip()) for name in names]
+    return [find_file(path) or path for path in paths]
+
+
+# bytes of text read at a time by iter_obj
+CHUNK_SIZE = 16 * 1024 * 1024
+
+# bytes read at a time when a file is only hashed or scanned
+BLOCK_SIZE = 1024 * 1024
+
+
+def texture_path(dirname, name):
+    """Returns the image a material refers to, or None when it cannot be found
+
+    Besides the name itself, relative to the material library, the bare file
+    name is looked up next to the library, as exporters often keep paths of
+    the machine the model was made on."""
+    if not name:
+        return None
+    for path in (name, re.split(r'[\\/]', name)[-1]):
+        path = os.path.join(dirname, path)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def read_obj(filename, chunk_size=CHUNK_SIZE):
+    """Reads an OBJ file into per object and per material triangle arrays
+
+    Returns the materials found in the referenced libraries and a list of
+    (object, material, vertices, normals, texcoords) tuples, where normals
+    and texcoords are None when the faces do not reference them."""
+    materials = OrderedDict()
+    parts = list(iter_obj(filename, materials, chunk_size))
+    return materials, parts
+
+
+def iter_obj(filename, materials=None, chunk_size=CHUNK_SIZE):
+    """Reads an OBJ file in chunks, yielding the parts of each object once it ends
+
+    Parts are the tuples returned by read_obj. At most chunk_size bytes of
+    text are held at a time, lines being converted to arrays chunk by chunk,
+    and the faces of an object are released as soon as its parts are
+    yielded. Vertex attributes are kept for the whole file, since faces may
+    refer to any of them. Materials are added to materials as their
+    libraries are read."""
+    reader = _ObjReader(filename, OrderedDict() if materials is None else materials)
+    rest = ''
+    with open_file(filename, 'r') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            # keep the partial last line for the next chunk
+            chunk = rest + chunk
+            end = chunk.rfind('\n') + 1
+            rest = chunk[end:]
+            if end:
+                yield from reader.feed(chunk[:end].splitlines(True))
+            del chunk
+    if rest:
+        yield from reader.feed([rest])
+    yield from reader.finish()
+
+
+class _ObjReader():
+    """State of an OBJ file being read by iter_obj"""
+
+    def __init__(self, filename, materials):
+        self.dirname = os.path.dirname(os.path.abspath(filename))
+        self.materials = materials
+        self.attributes = {'v': _Rows(3), 'vt': _Rows(2), 'vn': _Rows(3)}
+        self.lines = {'v': [], 'vt': [], 'vn': []}
+        self.faces = []
+        self.run = None
+        self.groups = OrderedDict()
+        self.material = None
+        self.obj = 0
+        self.last = None
+
+    def feed(self, lines):
+        """Reads a chunk of lines, yielding the parts of the objects it ends"""
+        positions, texcoords, normals = (self.lines[key] for key in ('v', 'vt', 'vn'))
+        faces = self.faces
+        for line in lines:
+            # keywords may be followed by any whitespace
+            fields = line.split(None, 1)
+            if not fields:
+                continue
+            key = fields[0]
+            rest = fields[1] if len(fields) > 1 else ''
+            if key == 'f':
+                if self.run is None:
+                    self.run = (self.material, self.count('v'),
+                                self.count('vt'), self.count('vn'))
+                faces.append(rest)
+                self.last = 'f'
+                continue
+            if self.run is not None:
+                self.end_run()
+            if key == 'v':
+                # a vertex right after a face starts a new object
+                if self.last == 'f':
+                    yield from self.end_object()
+                positions.append(rest)
+                self.last = 'v'
+            elif key == 'vt':
+                texcoords.append(rest)
+                self.last = 'vt'
+            elif key == 'vn':
+                normals.append(rest)
+                self.last = 'vn'
+            elif key == 'usemtl':
+                self.material = rest.strip()
+                self.last = 'usemtl'
+            elif key == 'mtllib':
+                path = find_file(os.path.join(self.dirname, rest.strip()))
+                if path is not None:
+                    self.materials.update(read_mtl(path))
+                self.last = 'mtllib'
+            elif not key.startswith('#'):
+                self.last = key
+        self.flush()
+
+    def finish(self):
+        """Yields the parts of the last object"""
+        if self.run is not None:
+            self.end_run()
+        yield from self.end_object()
+
+    def count(self, key):
+        """Returns the number of v, vt or vn read so far"""
+        return len(self.attributes[key]) + len(self.lines[key])
+
+    def flush(self):
+        """Converts the lines read so far into arrays"""
+        for key, lines in self.lines.items():
+            if lines:
+                self.attributes[key].extend(
+                    _read_floats(lines, self.attributes[key].width))
+                lines.clear()
+        if self.faces:
+            material, nv, nt, nn = self.run
+            self.groups.setdefault(material, []).append(
+                _read_faces(self.faces, (nv, nt, nn)))
+            self.faces.clear()
+
+    def end_run(self):
+        """Converts a finished run of consecutive faces"""
+        self.flush()
+        self.run = None
+
+    def end_object(self):
+        """Yields the parts of the current object, sorted by material"""
+        self.flush()
+        groups = OrderedDict()
+        for material, chunks in self.groups.items():
+            if material is None or material not in self.materials:
+                material = material or 'default'
+                self.materials.setdefault(material, _default_material())
+            groups.setdefault(material, []).extend(chunks)
+        self.groups = OrderedDict()
+
+        positions, texcoords, normals = (
+            self.attributes[key].data() for key in ('v', 'vt', 'vn'))
+        # order parts as they appear in the material libraries
+        order = list(self.materials.keys())
+        for material in sorted(groups.keys(), key=order.index):
+            chunks = groups.pop(material)
+            if len(set(tuple(chunk[0] >= 0) for chunk in chunks)) > 1:
+                raise ValueError(
+                    "Trying to merge vertex data with different format "
+                    "in material {}".format(material))
+            indices = np.concatenate(chunks)
+            del chunks
+            vertices = positions[indices[:, 0]]
+            uvs = texcoords[indices[:, 1]] if indices[0, 1] >= 0 else None
+            vns = normals[indices[:, 2]] if indices[0, 2] >= 0 else None
+            del indices
+            yield (self.obj, material, vertices, vns, uvs)
+        self.obj += 1
+
+
+class _Rows():
+    """Float32 array of rows of a fixed width, grown by doubling"""
+
+    def __init__(self, width):
+        self.width = width
+        self.array = np.zeros((0, width), dtype=np.float32)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def extend(self, rows):
+        """Appends rows at the end"""
+        size = self.size + len(rows)
+        if size > len(self.array):
+            array = np.empty((max(size, 2 * len(self.array)), self.width),
+                             dtype=np.float32)
+            array[:self.size] = self.array[:self.size]
+            self.array = array
+        self.array[self.size:size] = rows
+        self.size = size
+
+    def data(self):
+        """Returns the rows appended so far"""
+        return self.array[:self.size]
+
+
+def _default_material():
+    """Returns the parameters of a material missing from the library"""
+    return {'emission': (0.0, 0.0, 0.0), 'ambient': (0.2, 0.2, 0.2),
+            'diffuse': (0.8, 0.8, 0.8), 'specular': (0.0, 0.0, 0.0),
+            'shininess': 0.0, 'texture': None}
+
+
+def _color(values):
+    """Returns a RGB tuple padded with zeros"""
+    return tuple((list(map(float, values[:3])) + [0.0, 0.0, 0.0])[:3])
+
+
+def _read_floats(lines, width):
+    """Converts lines of numbers into a (len(lines), width) float32 array"""
+    if not lines:
+        return np.zeros((0, width), dtype=np.float32)
+    sizes = np.fromiter(map(len, map(str.split, lines)),
+                        dtype=np.int64, count=len(lines))
+    if sizes.min() >= width and sizes.min() == sizes.max():
+        data = np.fromstring(''.join(lines), dtype=np.float32, sep=' ')
+        if data.size == sizes.sum():
+            return data.reshape(len(lines), -1)[:, :width]
+    # lines with different number of values, missing ones are zero
+    return np.array([(line.split() + ['0'] * width)[:width] for line in lines], dtype=np.float32)
+
+
+def _read_faces(lines, counts):
+    """Converts face lines into triangulated (n, 3) v/vt/vn index arrays
+
+    Indices are zero based, missing vt or vn are marked by -1 and polygons
+    are triangulated as a fan around their first vertex."""
+    sizes = np.fromiter(map(len, map(str.split, lines)),
+                        dtype=np.int64, count=len(lines))
+    first = lines[0].split(None, 1)[0]
+    width = first.count('/') + 1
+    has_vt = width > 1 and first.split('/')[1] != ''
+
+    text = ''.join(lines).replace('//', '/0/').replace('/', ' ')
+    data = np.fromstring(text, dtype=np.int64, sep=' ')
+    if data.size != sizes.sum() * width:
+        raise ValueError("Faces with different vertex format in the same run")
+    data = data.reshape(-1, width)
+
+    indices = np.full((len(data), 3), -1, dtype=np.int64)
+    for column in range(width):
+        if column == 1 and not has_vt:
+            continue
+        values = data[:, column]
+        # positive indices are one based, negative ones are relative
+        indices[:, column] = np.where(values > 0, values - 1,
+                                      values + counts[column])
+
+    # fan triangulation: (v0, v1, v2) then (vj, v0, vj-1) for j > 2,
+    # the same triangles and winding pywavefront emits
+    triangles = sizes - 2
+    starts = np.cumsum(sizes) - sizes
+    first = np.repeat(starts, triangles)
+    j = np.arange(triangles.sum()) - \
+        np.repeat(np.cumsum(triangles) - triangles, triangles) + 2
+    corner = np.where((j == 2)[:, None],
+                      np.stack((first, first + 1, first + 2), axis=1),
+                      np.stack((first + j, first, first + j - 1), axis=1))
+    return indices[corner.ravel()]